@@ -1,15 +1,32 @@
 import os
+import re
 import json
+import time
 import logging
-from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_from_directory
+import threading
+import click
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import Flask, Response, g, render_template, request, jsonify, send_from_directory, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import case, exists, func, inspect, or_, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
-from groq import Groq
+from conversation import build_context, report_prompt, summary_prompt
+from database import configure_sqlite, engine_options, instrument_engine, normalize_database_url, upgrade_schema
+from metrics import InstrumentedBackend, Metrics, end_trace, start_trace, traced
+from session_cache import SessionCache
+from opening_pool import OpeningPool
+from session_archive import Reaper, pack_transcript, unpack_transcript
+from static_assets import StaticAssets
+from llm import LLMError, create_backend
+from llm_scheduler import BACKGROUND, INTERACTIVE, MOOD, LLMScheduler, ScheduledBackend
+from llm_cache import CachedBackend, ResponseCache
+from mood import LexiconMoodScorer
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging; LOG_LEVEL=DEBUG for development
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
 class Base(DeclarativeBase):
     pass
@@ -21,20 +38,126 @@ app = Flask(__name__, static_folder='static', static_url_path='')
 app.secret_key = os.environ.get("SESSION_SECRET", "ai-therapy-secret-key")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
-# Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///ai_therapy.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+# Configure the database. With Postgres every worker process keeps DB_POOL_SIZE connections,
+# plus up to DB_MAX_OVERFLOW more under load, and waits DB_POOL_TIMEOUT seconds for a free one.
+app.config["SQLALCHEMY_DATABASE_URI"] = normalize_database_url(os.environ.get("DATABASE_URL", "sqlite:///ai_therapy.db"))
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(
+    app.config["SQLALCHEMY_DATABASE_URI"],
+    pool_size=int(os.environ.get("DB_POOL_SIZE", "5")),
+    max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", "10")),
+    pool_timeout=int(os.environ.get("DB_POOL_TIMEOUT", "30"))
+)
 db.init_app(app)
 
-# Groq configuration for Llama 3
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "default_key")
-groq_client = Groq(api_key=GROQ_API_KEY)
-
 # Using Llama 3.1 8B model for fast inference
-LLAMA_MODEL = "llama3-8b-8192"
+LLAMA_MODEL = os.environ.get("LLM_MODEL", "llama3-8b-8192")
+
+# LLM backend: Groq by default, LLM_BACKEND=fake for offline load tests (see llm.py).
+# Every call goes through a scheduler that keeps us inside the provider quota,
+# admits patient replies before mood analysis before background work, and
+# retries 429/5xx with backoff. A per-minute limit of 0 disables that bucket.
+# The limits apply per process: with N workers, set them to the quota divided by N.
+llm_scheduler = LLMScheduler(
+    requests_per_minute=int(os.environ.get("LLM_REQUESTS_PER_MINUTE", "30")),
+    tokens_per_minute=int(os.environ.get("LLM_TOKENS_PER_MINUTE", "6000")),
+    max_retries=int(os.environ.get("LLM_MAX_RETRIES", "4"))
+)
+# Deterministic prompts (the initial mood rating and the reply to the fixed opening
+# greeting) are answered from a response cache. LLM_CACHE_SITES lists the call
+# sites allowed to use it; LLM_CACHE_DB adds a SQLite tier shared across restarts.
+llm_cache = ResponseCache(
+    max_entries=int(os.environ.get("LLM_CACHE_SIZE", "1024")),
+    ttl_seconds=int(os.environ.get("LLM_CACHE_TTL", "86400")),
+    db_path=os.environ.get("LLM_CACHE_DB") or None,
+    max_disk_entries=int(os.environ.get("LLM_CACHE_DISK_ENTRIES", "10000"))
+)
+LLM_CACHE_SITES = [site for site in os.environ.get("LLM_CACHE_SITES", "initial_mood,opening").split(",") if site]
+
+# Route, LLM call site and DB query timings, served at /metrics. TRACE_REQUESTS=1 (or
+# ?trace=1 / an X-Trace: 1 header on a single request) also breaks each request into phases.
+metrics = Metrics()
+metrics.describe("http_request_seconds", "Time to produce a response, per route; streams until their last event")
+metrics.describe("llm_call_seconds", "LLM call latency per call site, including quota wait and retries")
+metrics.describe("llm_first_token_seconds", "Time to first streamed token per call site")
+metrics.describe("db_query_seconds", "SQL statement execution time")
+TRACE_REQUESTS = os.environ.get("TRACE_REQUESTS", "0") == "1"
+
+llm = InstrumentedBackend(
+    CachedBackend(ScheduledBackend(create_backend(model=LLAMA_MODEL), llm_scheduler), llm_cache, LLM_CACHE_SITES),
+    metrics
+)
+
+# Mood analysis runs off the request path so the patient reply is returned right away.
+# Set MOOD_INLINE=1 (or pass "wait_for_mood": true to /chat) to wait for the score instead.
+MOOD_WORKERS = int(os.environ.get("MOOD_WORKERS", "4"))
+MOOD_INLINE = os.environ.get("MOOD_INLINE", "0") == "1"
+MOOD_WAIT_TIMEOUT = float(os.environ.get("MOOD_WAIT_TIMEOUT", "30"))
+mood_executor = ThreadPoolExecutor(max_workers=MOOD_WORKERS, thread_name_prefix="mood")
+
+# MOOD_SCORER=lexicon scores mood locally (see mood.py) instead of asking the model,
+# which saves one LLM call per turn and lets the score be returned with the reply.
+MOOD_SCORER = os.environ.get("MOOD_SCORER", "llm")
+lexicon_scorer = LexiconMoodScorer()
+# An AI message still unscored MOOD_LOST_AFTER seconds after it was stored has lost its
+# mood worker (a crash or restart); the reaper and the report job score it with the lexicon.
+MOOD_LOST_AFTER = int(os.environ.get("MOOD_LOST_AFTER", "600"))
+
+# Conversation context: once more than CONTEXT_TURNS exchanges (plus a batch of
+# SUMMARY_BATCH_MESSAGES) are unsummarized, the older ones are folded into
+# Session.summary in the background. Every message not yet folded is sent verbatim,
+# so nothing drops out of the prompt while a fold is pending; only the token budget trims it.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "6144"))
+CONTEXT_TURNS = int(os.environ.get("CONTEXT_TURNS", "6"))
+SUMMARY_BATCH_MESSAGES = int(os.environ.get("SUMMARY_BATCH_MESSAGES", "4"))
+summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+summarizing_sessions = set()
+summarizing_lock = threading.Lock()
+
+# Active conversations are cached in-process so a chat turn needs no DB reads;
+# the database stays the durable store and is only read on a cache miss.
+session_cache = SessionCache(
+    max_sessions=int(os.environ.get("SESSION_CACHE_SIZE", "1000")),
+    ttl_seconds=int(os.environ.get("SESSION_CACHE_TTL", "1800")),
+    max_bytes=int(os.environ.get("SESSION_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    # A safety cap for sessions whose summaries keep failing; well above what normally goes unfolded
+    max_messages=int(os.environ.get("SESSION_CACHE_MAX_MESSAGES", "100"))
+)
+# Consecutive turns of a session may be served by different worker processes, so a cache
+# hit is checked against the session row (one primary-key read) before it is used.
+# SESSION_CACHE_VALIDATE=0 skips that read when the app runs as a single process.
+SESSION_CACHE_VALIDATE = os.environ.get("SESSION_CACHE_VALIDATE", "1") == "1"
+
+# Session reports are written by the model on a worker pool once a session ends and are
+# tracked in the ReportJob table; /session_report answers 202 until the report is ready.
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", "2"))
+REPORT_TRANSCRIPT_MESSAGES = int(os.environ.get("REPORT_TRANSCRIPT_MESSAGES", "40"))
+REPORT_TRANSCRIPT_TOKENS = int(os.environ.get("REPORT_TRANSCRIPT_TOKENS", "3000"))
+REPORT_MAX_ATTEMPTS = int(os.environ.get("REPORT_MAX_ATTEMPTS", "3"))
+REPORT_STALE_SECONDS = int(os.environ.get("REPORT_STALE_SECONDS", "600"))
+report_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report")
+
+# A reaper thread marks sessions idle for SESSION_IDLE_TIMEOUT seconds as abandoned, and
+# moves the messages of sessions ended SESSION_ARCHIVE_AFTER seconds ago into one compressed
+# SessionArchive row each, so the message table /chat reads only holds recent sessions.
+# REAPER_INTERVAL=0 disables it; a timeout of 0 disables that half of the pass.
+SESSION_IDLE_TIMEOUT = int(os.environ.get("SESSION_IDLE_TIMEOUT", "3600"))
+SESSION_ARCHIVE_AFTER = int(os.environ.get("SESSION_ARCHIVE_AFTER", "86400"))
+REAPER_INTERVAL = float(os.environ.get("REAPER_INTERVAL", "300"))
+REAPER_BATCH_SIZE = int(os.environ.get("REAPER_BATCH_SIZE", "200"))
+
+# Pages, style.css and script.js are served from memory, fingerprinted and precompressed
+# (see static_assets.py). They belong in static/; a checkout that keeps them next to
+# app.py is served from there, limited to ROOT_ASSETS so nothing else in the tree is
+# exposed. STATIC_DIR overrides both.
+ROOT_ASSETS = {'homepage.html', 'therapy.html', 'technologies.html', 'how-to-play.html', 'chatbots.html',
+               'index.html', 'style.css', 'script.js'}
+STATIC_DIR = os.environ.get("STATIC_DIR") or (
+    os.path.join(app.root_path, 'static') if os.path.isdir(os.path.join(app.root_path, 'static')) else app.root_path
+)
+static_assets = StaticAssets(STATIC_DIR, names=ROOT_ASSETS if STATIC_DIR == app.root_path else None).load()
+
+DEFAULT_MOOD_SCORE = 5
+DEFAULT_MOOD_REFLECTION = "I am processing my emotions..."
 
 # AI Character definitions with detailed personalities
 AI_CHARACTERS = {
@@ -70,34 +193,227 @@ AI_CHARACTERS = {
     }
 }
 
+from models import Session, Message, ReportJob, SessionArchive
+
 with app.app_context():
-    from models import Session, Message
-    db.create_all()
+    # WAL journaling for file-backed SQLite; SQLITE_SYNCHRONOUS=FULL trades write latency for durability
+    configure_sqlite(db.engine, synchronous=os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"))
+    instrument_engine(db.engine, metrics)
+
+def init_db():
+    """Create missing tables, columns and indexes; run once per deploy rather than in every worker"""
+    with app.app_context():
+        db.create_all()
+        upgrade_schema(db.engine, db.metadata)
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create or upgrade the database schema"""
+    init_db()
+    click.echo("Database schema is up to date")
+
+def mood_score_value(value, default_score):
+    """A model-supplied mood score as an int from 1 to 10, or the default if it isn't a number"""
+    if isinstance(value, bool):
+        return default_score
+    try:
+        score = round(float(value))
+    except (TypeError, ValueError, OverflowError):
+        return default_score
+    return min(10, max(1, score))
+
+def parse_mood_json(content, default_score, default_reflection):
+    """Extract the {"mood_score", "self_reflection"} object from a model reply.
+
+    The score always comes back as an int from 1 to 10: it goes into SQL
+    arithmetic and the "id:score" trajectory string.
+    """
+    data = {}
+    with traced('parse'):
+        try:
+            # Try to extract JSON from the response
+            json_match = re.search(r'\{.*\}', content or "", re.DOTALL)
+            if json_match:
+                data = json.loads(json_match.group())
+        except (json.JSONDecodeError, Exception):
+            pass
+    if not isinstance(data, dict):
+        data = {}
+    reflection = data.get("self_reflection")
+    # Fallback for missing or unusable fields
+    return {
+        "mood_score": mood_score_value(data.get("mood_score"), default_score),
+        "self_reflection": reflection if isinstance(reflection, str) and reflection.strip() else default_reflection
+    }
+
+def mood_analysis_messages(character, ai_message, message):
+    """Prompt for rating the AI patient's mood after an exchange"""
+    return [
+        {
+            "role": "system",
+            "content": f"You are analyzing the emotional state of {character['name']} after this therapy interaction. Consider their personality and the conversation context. Rate their current mood from 1-10 (1=terrible, 10=excellent) and provide a brief first-person self-reflection from the AI's perspective. You MUST respond with valid JSON only, no other text: {{\"mood_score\": number, \"self_reflection\": \"one sentence from AI's perspective\"}}"
+        },
+        {
+            "role": "user",
+            "content": f"Latest AI response: {ai_message}\n\nLatest human message: {message}\n\nWhat is this AI's current emotional state?"
+        }
+    ]
+
+def analyze_mood(character, ai_message, message):
+    """Rate how the AI patient feels after the latest exchange"""
+    if MOOD_SCORER == 'lexicon':
+        return lexicon_scorer.score(character['id'], ai_message, message)
+    mood_analysis_response = llm.complete(mood_analysis_messages(character, ai_message, message), priority=MOOD, call_site='mood')
+    return parse_mood_json(mood_analysis_response.text, DEFAULT_MOOD_SCORE, DEFAULT_MOOD_REFLECTION)
+
+def message_mood_update(ai_msg_id, mood_score, mood_reflection):
+    """Statement storing the mood of an AI message that has none yet.
+
+    It matches no row once the message is scored, so a late mood worker and the
+    lost-mood pass never both add the same message to the session aggregates.
+    """
+    return update(Message).where(Message.id == ai_msg_id, Message.mood_score.is_(None)) \
+        .values(mood_score=mood_score, mood_reflection=mood_reflection).execution_options(synchronize_session=False)
+
+def session_mood_update(session_id, ai_msg_id, mood_score):
+    """Statement adding one AI message's mood score to its session's aggregates"""
+    return update(Session).where(Session.id == session_id) \
+        .values(mood_stats_update(ai_msg_id, mood_score)).execution_options(synchronize_session=False)
+
+def newer_ai_message_query(ai_msg):
+    """Any later AI message of the same session.
+
+    Only the newest AI message may move the session mood; an older, slower
+    analysis finishing late must not overwrite a fresher score.
+    """
+    return select(Message.id).where(
+        Message.session_id == ai_msg.session_id,
+        Message.sender == 'ai',
+        Message.id > ai_msg.id
+    ).limit(1)
+
+def apply_session_mood(session, mood_score):
+    session.current_mood = mood_score
+    if session.status == 'completed':
+        session.final_mood = mood_score
+
+def score_message_mood(ai_msg_id, ai_message, message):
+    """Worker task: analyze mood for a stored AI message and write it back"""
+    with app.app_context():
+        try:
+            ai_msg = db.session.get(Message, ai_msg_id)
+            session = db.session.get(Session, ai_msg.session_id)
+            character = AI_CHARACTERS[session.ai_character_id]
+            try:
+                mood_data = analyze_mood(character, ai_message, message)
+            except Exception as e:
+                logging.error("Mood analysis failed for message %s: %s", ai_msg_id, e)
+                mood_data = {}
+
+            mood_score = mood_data.get('mood_score', DEFAULT_MOOD_SCORE)
+            mood_reflection = mood_data.get('self_reflection', DEFAULT_MOOD_REFLECTION)
+            latest = False
+            if db.session.execute(message_mood_update(ai_msg.id, mood_score, mood_reflection)).rowcount:
+                db.session.execute(session_mood_update(session.id, ai_msg.id, mood_score))
+                latest = db.session.execute(newer_ai_message_query(ai_msg)).first() is None
+                if latest:
+                    apply_session_mood(session, mood_score)
+            db.session.commit()
+            if latest:
+                session_cache.set_mood(session.id, mood_score)
+
+            # Read back after the commit, in case the message had been scored already
+            return {'mood_score': ai_msg.mood_score, 'mood_reflection': ai_msg.mood_reflection}
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # A trace stays attached to the thread until its next request, so streamed bodies
+    # (which run after teardown) still report into it
+    end_trace()
+    if TRACE_REQUESTS or request.args.get('trace') == '1' or request.headers.get('X-Trace') == '1':
+        g.trace = start_trace()
+
+@app.after_request
+def record_request(response):
+    """Record route latency and, for traced requests, expose the phase breakdown"""
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    start = g.get('request_start')
+    if start is not None:
+        method = request.method
+
+        def observe():
+            metrics.observe('http_request_seconds', time.perf_counter() - start, route=route, method=method)
+        # A streamed body is produced after this hook, so it is timed once the server closes the response
+        if response.is_streamed:
+            response.call_on_close(observe)
+        else:
+            observe()
+    metrics.inc('http_requests_total', route=route, method=request.method, status=str(response.status_code))
+
+    trace = g.get('trace')
+    # Streamed responses are still running here; their trace goes into the final event instead
+    if trace is not None and not response.is_streamed:
+        response.headers['Server-Timing'] = trace.server_timing()
+        logging.info("Trace %s %s: %s", request.method, request.path, trace.summary())
+    return response
+
+def with_trace(payload):
+    """Add the current request's phase breakdown to a response body when it is traced"""
+    trace = g.get('trace')
+    if trace is not None:
+        payload['trace'] = trace.summary()
+    return payload
+
+def serve_page(name):
+    """Serve a page from the in-memory asset store, falling back to the static folder"""
+    response = static_assets.response(request, name)
+    return response if response is not None else send_from_directory('static', name)
+
+def static_file(filename):
+    """Unfingerprinted asset URLs such as /style.css, revalidated by ETag"""
+    response = static_assets.response(request, filename)
+    return response if response is not None else app.send_static_file(filename)
+
+app.view_functions['static'] = static_file
+
+@app.route('/assets/<path:filename>')
+def fingerprinted_asset(filename):
+    """Fingerprinted asset URLs; their content never changes, so they are cached for a year"""
+    response = static_assets.response(request, fingerprinted_name=filename)
+    if response is None:
+        return jsonify({'error': 'Not found'}), 404
+    return response
 
 @app.route('/')
 def index():
     """Serve the homepage"""
-    return send_from_directory('static', 'homepage.html')
+    return serve_page('homepage.html')
 
 @app.route('/therapy')
 def therapy():
     """Serve the therapy session page"""
-    return send_from_directory('static', 'therapy.html')
+    return serve_page('therapy.html')
 
 @app.route('/technologies')
 def technologies():
     """Serve the technologies page"""
-    return send_from_directory('static', 'technologies.html')
+    return serve_page('technologies.html')
 
 @app.route('/how-to-play')
 def how_to_play():
     """Serve the how to play page"""
-    return send_from_directory('static', 'how-to-play.html')
+    return serve_page('how-to-play.html')
 
 @app.route('/chatbots')
 def chatbots():
     """Serve the chatbots information page"""
-    return send_from_directory('static', 'chatbots.html')
+    return serve_page('chatbots.html')
 
 @app.route('/ai-characters', methods=['GET'])
 def get_ai_characters():
@@ -112,9 +428,493 @@ def get_ai_characters():
             })
         return jsonify({'characters': characters})
     except Exception as e:
-        logging.error(f"Error fetching AI characters: {str(e)}")
+        logging.error("Error fetching AI characters: %s", e)
         return jsonify({'error': 'Failed to fetch AI characters'}), 500
 
+OPENING_GREETING = "Hello, I'm your therapist. This is a safe space for you to share what's on your mind. How are you feeling today, and what brought you here?"
+
+def initial_mood_messages(character):
+    """Prompt for rating a character's mood before the session starts"""
+    return [
+        {
+            "role": "system",
+            "content": f"You are analyzing the initial emotional state of {character['name']}. Based on their personality: {character['initial_prompt'][:200]}... Rate their starting mood from 1-10 (1=terrible, 10=excellent) and provide a brief self-reflection. You MUST respond with valid JSON only, no other text: {{\"mood_score\": number, \"self_reflection\": \"one sentence\"}}"
+        },
+        {
+            "role": "user",
+            "content": "What is this AI's initial emotional state as they enter therapy?"
+        }
+    ]
+
+def opening_messages(character):
+    """Prompt for the patient's reply to the therapist's fixed greeting"""
+    return [
+        {
+            "role": "system",
+            "content": character['initial_prompt']
+        },
+        {
+            "role": "user",
+            "content": OPENING_GREETING
+        }
+    ]
+
+def analyze_initial_mood(character, priority=INTERACTIVE, call_site='initial_mood'):
+    """Rate a character's starting mood"""
+    if MOOD_SCORER == 'lexicon':
+        return lexicon_scorer.initial(character['id'])
+    initial_mood_response = llm.complete(initial_mood_messages(character), priority=priority, call_site=call_site)
+    return parse_mood_json(initial_mood_response.text, 3, "Starting therapy session...")
+
+def generate_opening_message(character, priority=INTERACTIVE, call_site='opening'):
+    """Ask the model for the patient's reply to the opening greeting"""
+    return llm.complete(opening_messages(character), priority=priority, call_site=call_site).text
+
+def generate_opening(character_id):
+    """Produce one (initial_mood, reflection, opening_message) tuple for the opening pool"""
+    character = AI_CHARACTERS[character_id]
+    # Pool entries bypass the response cache, otherwise every entry would be identical
+    mood_data = analyze_initial_mood(character, priority=BACKGROUND, call_site='pool_initial_mood')
+    return (
+        mood_data.get('mood_score', 3),
+        mood_data.get('self_reflection', 'Starting therapy session...'),
+        generate_opening_message(character, priority=BACKGROUND, call_site='pool_opening')
+    )
+
+# Session openings are pre-generated in the background so /start_session is a
+# plain DB insert; it falls back to live generation when a pool runs dry.
+opening_pool = OpeningPool(
+    generate_opening,
+    AI_CHARACTERS.keys(),
+    depth=int(os.environ.get("OPENING_POOL_DEPTH", "3")),
+    max_age=int(os.environ.get("OPENING_POOL_MAX_AGE", "3600"))
+)
+
+def take_opening(character_id):
+    """Return (mood_data, opening_message) from the pool, or None if it is empty"""
+    entry = opening_pool.take(character_id)
+    if entry is None:
+        return None
+    initial_mood, reflection, ai_message = entry
+    return {"mood_score": initial_mood, "self_reflection": reflection}, ai_message
+
+def session_version_query(session_id):
+    """The columns a cached entry is checked against with session_cache.is_current()"""
+    return select(Session.message_count, Session.summary_through, Session.current_mood) \
+        .filter_by(id=session_id, status='active')
+
+def recent_messages_query(session):
+    """Messages not yet folded into the summary, newest first, as many as the cache keeps"""
+    query = select(Message).where(Message.session_id == session.id)
+    if session.summary_through:
+        query = query.where(Message.id > session.summary_through)
+    return query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(session_cache.max_messages)
+
+def cache_session_state(session, recent):
+    """Cache a loaded session from its recent_messages_query() rows; returns the cached state"""
+    history = [
+        {"id": msg.id, "role": "assistant" if msg.sender == "ai" else "user", "content": msg.content}
+        for msg in reversed(recent)
+    ]
+    return session_cache.put(session.id, session.ai_character_id, session.current_mood,
+                             session.summary, session.summary_through, history, session.message_count)
+
+def load_session_state(session_id):
+    """Return the cached conversation state of an active session, loading it from the DB on a miss"""
+    try:
+        session_id = int(session_id)
+    except (TypeError, ValueError):
+        return None
+
+    state = session_cache.get(session_id)
+    if state is not None:
+        if not SESSION_CACHE_VALIDATE:
+            return state
+        row = db.session.execute(session_version_query(session_id)).first()
+        if row is None:
+            session_cache.invalidate(session_id)
+            return None
+        if session_cache.is_current(session_id, *row):
+            return state
+
+    session = Session.query.filter_by(id=session_id, status='active').first()
+    if not session:
+        return None
+    if session.message_count is None:
+        backfill_session_stats(db.session, session)
+        db.session.commit()
+
+    recent = db.session.execute(recent_messages_query(session)).scalars().all()
+    return cache_session_state(session, recent)
+
+def build_conversation(state, character, message):
+    """Build the chat prompt; returns (messages, estimated_prompt_tokens, unsummarized_count)"""
+    history = [{"role": msg["role"], "content": msg["content"]} for msg in state["history"]]
+
+    # System prompt with brevity instruction, running summary, recent turns, current message
+    conversation_history, prompt_tokens = build_context(
+        character['initial_prompt'] + " Keep your responses brief - maximum 2-3 sentences only.",
+        history,
+        message,
+        summary=state["summary"],
+        budget=CONTEXT_TOKEN_BUDGET
+    )
+    return conversation_history, prompt_tokens, len(history)
+
+def summarize_session(session_id):
+    """Worker task: fold messages older than the verbatim window into Session.summary"""
+    with app.app_context():
+        try:
+            session = db.session.get(Session, session_id)
+            query = Message.query.filter(Message.session_id == session_id)
+            if session.summary_through:
+                query = query.filter(Message.id > session.summary_through)
+            pending = query.order_by(Message.timestamp, Message.id).all()
+
+            # Fold whole exchanges only, so the verbatim window starts on a therapist message
+            fold_count = len(pending) - CONTEXT_TURNS * 2
+            fold_count -= fold_count % 2
+            if fold_count <= 0:
+                return
+            to_fold = pending[:fold_count]
+
+            character = AI_CHARACTERS[session.ai_character_id]
+            summary_response = llm.complete(
+                summary_prompt(
+                    character['name'],
+                    session.summary,
+                    [{"role": "assistant" if m.sender == "ai" else "user", "content": m.content} for m in to_fold]
+                ),
+                priority=BACKGROUND,
+                call_site='summary'
+            )
+            new_summary = summary_response.text.strip()
+            if not new_summary:
+                return
+
+            # Another process may have folded these turns meanwhile; only the first write wins
+            folded = Session.query.filter(
+                Session.id == session_id,
+                Session.summary_through.is_(None) if session.summary_through is None
+                else Session.summary_through == session.summary_through
+            ).update({'summary': new_summary, 'summary_through': to_fold[-1].id}, synchronize_session=False)
+            db.session.commit()
+            if folded:
+                session_cache.set_summary(session_id, new_summary, to_fold[-1].id)
+        except Exception as e:
+            logging.error("Summarizing session %s failed: %s", session_id, e)
+            db.session.rollback()
+        finally:
+            db.session.remove()
+
+def maybe_summarize(session_id, unsummarized_count):
+    """Queue a summary update once enough messages have left the verbatim window"""
+    if unsummarized_count < CONTEXT_TURNS * 2 + SUMMARY_BATCH_MESSAGES:
+        return
+    with summarizing_lock:
+        # One fold per session at a time, otherwise two workers could fold the same turns
+        if session_id in summarizing_sessions:
+            return
+        summarizing_sessions.add(session_id)
+
+    def run():
+        try:
+            summarize_session(session_id)
+        finally:
+            with summarizing_lock:
+                summarizing_sessions.discard(session_id)
+
+    summary_executor.submit(run)
+
+def new_session_row(character_id, mood_data):
+    """An unsaved active Session starting at the initial mood"""
+    session = Session(
+        ai_character_id=character_id,
+        start_time=datetime.utcnow(),
+        status='active'
+    )
+    session.initial_mood = mood_data.get('mood_score', 3)
+    session.current_mood = session.initial_mood
+    return session
+
+def opening_message_rows(session, mood_data, ai_message):
+    """The unsaved (human_msg, ai_msg) opening exchange of a flushed session"""
+    human_msg = Message(
+        session_id=session.id,
+        sender='human',
+        content=OPENING_GREETING,
+        timestamp=datetime.utcnow()
+    )
+    ai_msg = Message(
+        session_id=session.id,
+        sender='ai',
+        content=ai_message,
+        timestamp=datetime.utcnow(),
+        mood_score=session.initial_mood,
+        mood_reflection=mood_data.get('self_reflection', 'Starting therapy session...')
+    )
+    return human_msg, ai_msg
+
+def cache_opened_session(session, human_msg, ai_msg):
+    """Warm the cache so the first chat turn is served without DB reads"""
+    session_cache.put(session.id, session.ai_character_id, session.current_mood, None, None, [
+        {"id": human_msg.id, "role": "user", "content": human_msg.content},
+        {"id": ai_msg.id, "role": "assistant", "content": ai_msg.content}
+    ], session.message_count)
+
+def create_session(character_id, mood_data, ai_message):
+    """Persist a new session together with its opening exchange"""
+    session = new_session_row(character_id, mood_data)
+    db.session.add(session)
+    # Flush to get session.id; the session and its opening exchange commit together
+    db.session.flush()
+
+    human_msg, ai_msg = opening_message_rows(session, mood_data, ai_message)
+    db.session.add_all([human_msg, ai_msg])
+    db.session.flush()
+    start_session_stats(session, ai_msg.id, ai_message)
+    db.session.commit()
+
+    cache_opened_session(session, human_msg, ai_msg)
+    return session
+
+def start_session_stats(session, ai_msg_id, ai_message):
+    """Initialize the running aggregates of a new session from its opening exchange"""
+    session.turn_count = 0
+    session.message_count = 2
+    session.human_chars = len(OPENING_GREETING)
+    session.ai_chars = len(ai_message)
+    session.latency_total_ms = 0
+    session.latency_max_ms = 0
+    session.mood_count = 1
+    session.mood_total = session.initial_mood
+    session.mood_min = session.initial_mood
+    session.mood_max = session.initial_mood
+    session.mood_trajectory = f"{ai_msg_id}:{session.initial_mood}"
+    session.last_activity = datetime.utcnow()
+
+def turn_stats_update(message, ai_message, latency_ms):
+    """Session column updates for one stored chat turn.
+
+    These are SQL expressions rather than values read and written back, so the
+    mood worker and the next turn can update the same row without losing counts.
+    """
+    return {
+        'turn_count': Session.turn_count + 1,
+        'message_count': Session.message_count + 2,
+        'human_chars': Session.human_chars + len(message),
+        'ai_chars': Session.ai_chars + len(ai_message),
+        'latency_total_ms': Session.latency_total_ms + latency_ms,
+        'latency_max_ms': case((Session.latency_max_ms < latency_ms, latency_ms), else_=Session.latency_max_ms),
+        'last_activity': datetime.utcnow()
+    }
+
+def mood_stats_update(ai_msg_id, mood_score):
+    """Session column updates adding one AI message's mood score to the aggregates"""
+    return {
+        'mood_count': Session.mood_count + 1,
+        'mood_total': Session.mood_total + mood_score,
+        'mood_min': case((or_(Session.mood_min.is_(None), Session.mood_min > mood_score), mood_score),
+                         else_=Session.mood_min),
+        'mood_max': case((or_(Session.mood_max.is_(None), Session.mood_max < mood_score), mood_score),
+                         else_=Session.mood_max),
+        'mood_trajectory': Session.mood_trajectory + f",{ai_msg_id}:{mood_score}"
+    }
+
+def backfill_session_stats(db_session, session):
+    """Compute the aggregates of a session created before they were maintained per turn"""
+    counts = db_session.execute(
+        select(Message.sender, func.count(Message.id), func.coalesce(func.sum(func.length(Message.content)), 0))
+        .where(Message.session_id == session.id)
+        .group_by(Message.sender)
+    ).all()
+    by_sender = {sender: (count, chars) for sender, count, chars in counts}
+    human_count, session.human_chars = by_sender.get('human', (0, 0))
+    ai_count, session.ai_chars = by_sender.get('ai', (0, 0))
+    session.message_count = human_count + ai_count
+    session.turn_count = max(0, human_count - 1)
+
+    moods = db_session.execute(
+        select(Message.id, Message.mood_score)
+        .where(Message.session_id == session.id, Message.sender == 'ai', Message.mood_score.isnot(None))
+        .order_by(Message.id)
+    ).all()
+    scores = [score for _, score in moods]
+    session.mood_count = len(scores)
+    session.mood_total = sum(scores)
+    session.mood_min = min(scores) if scores else None
+    session.mood_max = max(scores) if scores else None
+    session.mood_trajectory = ",".join(f"{msg_id}:{score}" for msg_id, score in moods)
+    # Response latencies were never recorded for these sessions; they stay NULL
+
+def session_started_payload(session, character, ai_message, mood_data):
+    """JSON body returned once a session has started"""
+    return {
+        'session_id': session.id,
+        'ai_character': character,
+        'initial_message': ai_message,
+        'initial_mood': session.initial_mood,
+        'mood_reflection': mood_data.get('self_reflection', 'Starting therapy session...')
+    }
+
+def turn_message_rows(session_id, character_id, message, ai_message, received_at, prompt_tokens=None):
+    """The unsaved (human_msg, ai_msg) of a chat turn; the AI message is already scored with the lexicon scorer"""
+    human_msg = Message(
+        session_id=session_id,
+        sender='human',
+        content=message,
+        timestamp=received_at
+    )
+    # With the LLM scorer the AI message's mood is filled in by the mood worker
+    ai_msg = Message(
+        session_id=session_id,
+        sender='ai',
+        content=ai_message,
+        timestamp=datetime.utcnow(),
+        prompt_tokens=prompt_tokens
+    )
+    if MOOD_SCORER == 'lexicon':
+        # Local scoring takes well under a millisecond, so it is written with the turn
+        with traced('parse'):
+            mood_data = lexicon_scorer.score(character_id, ai_message, message)
+        ai_msg.mood_score = mood_data['mood_score']
+        ai_msg.mood_reflection = mood_data['self_reflection']
+    return human_msg, ai_msg
+
+def turn_session_update(human_msg, ai_msg):
+    """Statement updating the session aggregates for a flushed chat turn"""
+    latency_ms = int((ai_msg.timestamp - human_msg.timestamp).total_seconds() * 1000)
+    session_update = turn_stats_update(human_msg.content, ai_msg.content, latency_ms)
+    if ai_msg.mood_score is not None:
+        session_update['current_mood'] = ai_msg.mood_score
+        session_update.update(mood_stats_update(ai_msg.id, ai_msg.mood_score))
+    return update(Session).where(Session.id == ai_msg.session_id).values(session_update) \
+        .execution_options(synchronize_session=False)
+
+def cache_turn(human_msg, ai_msg):
+    """Add a committed chat turn, and its mood if already scored, to the cached session state"""
+    session_cache.append(ai_msg.session_id, [
+        {"id": human_msg.id, "role": "user", "content": human_msg.content},
+        {"id": ai_msg.id, "role": "assistant", "content": ai_msg.content}
+    ])
+    if ai_msg.mood_score is not None:
+        session_cache.set_mood(ai_msg.session_id, ai_msg.mood_score)
+
+def store_turn(session_id, character_id, message, ai_message, received_at, prompt_tokens=None):
+    """Persist both messages of a chat turn and score or queue its mood; returns (ai_msg, mood_future)"""
+    human_msg, ai_msg = turn_message_rows(session_id, character_id, message, ai_message, received_at, prompt_tokens)
+    db.session.add_all([human_msg, ai_msg])
+    db.session.flush()
+
+    # Session aggregates are updated in the same transaction as the messages
+    db.session.execute(turn_session_update(human_msg, ai_msg))
+    db.session.commit()
+
+    cache_turn(human_msg, ai_msg)
+    if ai_msg.mood_score is not None:
+        return ai_msg, None
+
+    # Perform emotional analysis in the background
+    mood_future = mood_executor.submit(score_message_mood, ai_msg.id, ai_message, message)
+    return ai_msg, mood_future
+
+def reply_payload(ai_msg, mood_future, wait_for_mood):
+    """JSON body for a chat reply, optionally waiting for the mood result"""
+    mood_score = ai_msg.mood_score
+    mood_reflection = ai_msg.mood_reflection
+    if mood_future is not None and wait_for_mood:
+        try:
+            with traced('mood_wait'):
+                mood_result = mood_future.result(timeout=MOOD_WAIT_TIMEOUT)
+            mood_score = mood_result['mood_score']
+            mood_reflection = mood_result['mood_reflection']
+        except Exception as e:
+            logging.error("Waiting for mood analysis failed: %s", e)
+
+    return {
+        'ai_response': ai_msg.content,
+        'message_id': ai_msg.id,
+        'mood_pending': mood_score is None,
+        'mood_score': mood_score,
+        'mood_reflection': mood_reflection,
+        'prompt_tokens': ai_msg.prompt_tokens
+    }
+
+def llm_error_response(e, fallback_message):
+    """Map an exception from the LLM call path to an error body and status code"""
+    status_code = e.status_code if isinstance(e, LLMError) else None
+    if status_code == 429:
+        return {'error': 'Groq API rate limit exceeded. Please wait a moment and try again.'}, 429
+    elif status_code == 401:
+        return {'error': 'Groq API authentication failed. Please check your API key.'}, 401
+    else:
+        return {'error': fallback_message}, 500
+
+def sse_event(event, payload):
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def sse_response(events):
+    """Wrap an event generator in a streaming text/event-stream response"""
+    return Response(stream_with_context(events), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def open_session(ai_character_id):
+    """Start a session with its opening exchange; returns (session, mood_data, opening_message)"""
+    character = AI_CHARACTERS[ai_character_id]
+    opening = take_opening(ai_character_id)
+    if opening:
+        mood_data, ai_message = opening
+    else:
+        # Generate initial mood score
+        mood_data = analyze_initial_mood(character)
+
+        # Generate opening message from AI
+        ai_message = generate_opening_message(character)
+
+    session = create_session(ai_character_id, mood_data, ai_message)
+    return session, mood_data, ai_message
+
+def run_chat_turn(state, message):
+    """One chat turn of a loaded session: build the prompt, get the reply and store both.
+
+    Shared by /chat and the self-play runner; returns (ai_msg, mood_future).
+    """
+    session_id = state['session_id']
+    received_at = datetime.utcnow()
+    
+    # Get character info
+    character = AI_CHARACTERS[state['ai_character_id']]
+    
+    # Get recent conversation history and summary for context
+    with traced('prompt_build'):
+        conversation_history, prompt_tokens, history_size = build_conversation(state, character, message)
+    
+    # Generate AI response
+    ai_response = llm.complete(conversation_history, call_site='reply')
+    
+    ai_message = ai_response.text
+    if ai_response.prompt_tokens is not None:
+        prompt_tokens = ai_response.prompt_tokens
+    
+    ai_msg, mood_future = store_turn(session_id, state['ai_character_id'], message, ai_message, received_at, prompt_tokens)
+    maybe_summarize(session_id, history_size + 2)
+    return ai_msg, mood_future
+
+def complete_session(session):
+    """Mark an active session completed and queue its report"""
+    session.end_time = datetime.utcnow()
+    session.status = 'completed'
+    session.final_mood = session.current_mood
+    # The report job is committed with the status change so no ended session goes without one
+    job = ReportJob(session_id=session.id)
+    db.session.add(job)
+    db.session.commit()
+    session_cache.invalidate(session.id)
+    queue_report_job(job.id)
+
 @app.route('/start_session', methods=['POST'])
 def start_session():
     """Start a new therapy session with an AI character"""
@@ -125,100 +925,60 @@ def start_session():
         if ai_character_id not in AI_CHARACTERS:
             return jsonify({'error': 'Invalid AI character'}), 400
         
-        # Create new session
-        session = Session(
-            ai_character_id=ai_character_id,
-            start_time=datetime.utcnow(),
-            status='active'
-        )
-        db.session.add(session)
-        db.session.commit()
-        
-        # Generate initial mood score
         character = AI_CHARACTERS[ai_character_id]
-        initial_mood_response = groq_client.chat.completions.create(
-            model=LLAMA_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"You are analyzing the initial emotional state of {character['name']}. Based on their personality: {character['initial_prompt'][:200]}... Rate their starting mood from 1-10 (1=terrible, 10=excellent) and provide a brief self-reflection. You MUST respond with valid JSON only, no other text: {{\"mood_score\": number, \"self_reflection\": \"one sentence\"}}"
-                },
-                {
-                    "role": "user",
-                    "content": "What is this AI's initial emotional state as they enter therapy?"
-                }
-            ]
-        )
-        
-        mood_content = initial_mood_response.choices[0].message.content or "{}"
-        try:
-            # Try to extract JSON from the response
-            import re
-            json_match = re.search(r'\{.*\}', mood_content, re.DOTALL)
-            if json_match:
-                mood_data = json.loads(json_match.group())
-            else:
-                # Fallback if no JSON found
-                mood_data = {"mood_score": 3, "self_reflection": "Starting therapy session..."}
-        except (json.JSONDecodeError, Exception):
-            mood_data = {"mood_score": 3, "self_reflection": "Starting therapy session..."}
-        session.initial_mood = mood_data.get('mood_score', 3)
-        db.session.commit()
-        
-        # Generate opening message from AI
-        opening_response = groq_client.chat.completions.create(
-            model=LLAMA_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": character['initial_prompt']
-                },
-                {
-                    "role": "user",
-                    "content": "Hello, I'm your therapist. This is a safe space for you to share what's on your mind. How are you feeling today, and what brought you here?"
-                }
-            ]
-        )
-        
-        ai_message = opening_response.choices[0].message.content
-        
-        # Store the opening exchange
-        human_msg = Message(
-            session_id=session.id,
-            sender='human',
-            content="Hello, I'm your therapist. This is a safe space for you to share what's on your mind. How are you feeling today, and what brought you here?",
-            timestamp=datetime.utcnow()
-        )
-        ai_msg = Message(
-            session_id=session.id,
-            sender='ai',
-            content=ai_message,
-            timestamp=datetime.utcnow(),
-            mood_score=session.initial_mood
-        )
+        session, mood_data, ai_message = open_session(ai_character_id)
         
-        db.session.add(human_msg)
-        db.session.add(ai_msg)
-        db.session.commit()
-        
-        return jsonify({
-            'session_id': session.id,
-            'ai_character': character,
-            'initial_message': ai_message,
-            'initial_mood': session.initial_mood,
-            'mood_reflection': mood_data.get('self_reflection', 'Starting therapy session...')
-        })
+        return jsonify(session_started_payload(session, character, ai_message, mood_data))
         
     except Exception as e:
-        logging.error(f"Error starting session: {str(e)}")
-        logging.debug(f"Full exception details: {e}", exc_info=True)
-        error_message = str(e)
-        if "429" in error_message or "quota" in error_message.lower():
-            return jsonify({'error': 'Groq API rate limit exceeded. Please wait a moment and try again.'}), 429
-        elif "401" in error_message or "authentication" in error_message.lower():
-            return jsonify({'error': 'Groq API authentication failed. Please check your API key.'}), 401
-        else:
-            return jsonify({'error': 'Failed to start session. Please try again.'}), 500
+        logging.error("Error starting session: %s", e)
+        logging.debug("Full exception details: %s", e, exc_info=True)
+        db.session.rollback()
+        body, status = llm_error_response(e, 'Failed to start session. Please try again.')
+        return jsonify(body), status
+
+@app.route('/start_session/stream', methods=['POST'])
+def start_session_stream():
+    """Start a session, streaming the opening message as Server-Sent Events"""
+    data = request.get_json()
+    ai_character_id = data.get('ai_character_id')
+
+    if ai_character_id not in AI_CHARACTERS:
+        return jsonify({'error': 'Invalid AI character'}), 400
+
+    character = AI_CHARACTERS[ai_character_id]
+
+    def events():
+        try:
+            opening = take_opening(ai_character_id)
+            if opening:
+                mood_data, ai_message = opening
+                yield sse_event('token', {'text': ai_message})
+                session = create_session(ai_character_id, mood_data, ai_message)
+                yield sse_event('done', session_started_payload(session, character, ai_message, mood_data))
+                return
+
+            # The initial mood rating runs alongside the streamed opening
+            mood_future = mood_executor.submit(analyze_initial_mood, character)
+
+            tokens = []
+            for token in llm.stream(opening_messages(character), call_site='opening'):
+                tokens.append(token)
+                yield sse_event('token', {'text': token})
+            ai_message = "".join(tokens)
+
+            mood_data = mood_future.result(timeout=MOOD_WAIT_TIMEOUT)
+            session = create_session(ai_character_id, mood_data, ai_message)
+            yield sse_event('done', session_started_payload(session, character, ai_message, mood_data))
+
+        except Exception as e:
+            logging.error("Error starting streamed session: %s", e)
+            logging.debug("Full exception details: %s", e, exc_info=True)
+            db.session.rollback()
+            body, status = llm_error_response(e, 'Failed to start session. Please try again.')
+            yield sse_event('error', dict(body, status=status))
+
+    return sse_response(events())
 
 @app.route('/chat', methods=['POST'])
 def chat():
@@ -231,115 +991,140 @@ def chat():
         if not session_id or not message:
             return jsonify({'error': 'Missing session_id or message'}), 400
         
-        # Get session and verify it exists
-        session = Session.query.filter_by(id=session_id, status='active').first()
-        if not session:
+        # Get session state (cached for active sessions) and verify it exists
+        state = load_session_state(session_id)
+        if not state:
             return jsonify({'error': 'Invalid or inactive session'}), 400
         
-        # Store human message
-        human_msg = Message(
-            session_id=session_id,
-            sender='human',
-            content=message,
-            timestamp=datetime.utcnow()
-        )
-        db.session.add(human_msg)
-        
-        # Get character info
-        character = AI_CHARACTERS[session.ai_character_id]
+        ai_msg, mood_future = run_chat_turn(state, message)
         
-        # Get full conversation history for context
-        messages = Message.query.filter_by(session_id=session_id).order_by(Message.timestamp).all()
-        conversation_history = []
+        return jsonify(with_trace(reply_payload(ai_msg, mood_future, data.get('wait_for_mood', MOOD_INLINE))))
         
-        # Add system prompt with brevity instruction
-        conversation_history.append({
-            "role": "system",
-            "content": character['initial_prompt'] + " Keep your responses brief - maximum 2-3 sentences only."
-        })
-        
-        # Add conversation history
-        for msg in messages:
-            role = "assistant" if msg.sender == "ai" else "user"
-            conversation_history.append({
-                "role": role,
-                "content": msg.content
-            })
-        
-        # Add current human message
-        conversation_history.append({
-            "role": "user",
-            "content": message
-        })
-        
-        # Generate AI response
-        ai_response = groq_client.chat.completions.create(
-            model=LLAMA_MODEL,
-            messages=conversation_history
-        )
-        
-        ai_message = ai_response.choices[0].message.content
-        
-        # Perform emotional analysis
-        mood_analysis_response = groq_client.chat.completions.create(
-            model=LLAMA_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"You are analyzing the emotional state of {character['name']} after this therapy interaction. Consider their personality and the conversation context. Rate their current mood from 1-10 (1=terrible, 10=excellent) and provide a brief first-person self-reflection from the AI's perspective. You MUST respond with valid JSON only, no other text: {{\"mood_score\": number, \"self_reflection\": \"one sentence from AI's perspective\"}}"
-                },
-                {
-                    "role": "user",
-                    "content": f"Latest AI response: {ai_message}\n\nLatest human message: {message}\n\nWhat is this AI's current emotional state?"
-                }
-            ]
-        )
-        
-        mood_content = mood_analysis_response.choices[0].message.content or "{}"
+    except Exception as e:
+        logging.error("Error in chat: %s", e)
+        logging.debug("Full exception details: %s", e, exc_info=True)
+        db.session.rollback()
+        body, status = llm_error_response(e, 'Failed to process chat message. Please try again.')
+        return jsonify(body), status
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Handle a chat message, streaming the AI reply as Server-Sent Events"""
+    data = request.get_json()
+    session_id = data.get('session_id')
+    message = data.get('message')
+
+    if not session_id or not message:
+        return jsonify({'error': 'Missing session_id or message'}), 400
+
+    state = load_session_state(session_id)
+    if not state:
+        return jsonify({'error': 'Invalid or inactive session'}), 400
+    session_id = state['session_id']
+
+    received_at = datetime.utcnow()
+    character = AI_CHARACTERS[state['ai_character_id']]
+    with traced('prompt_build'):
+        conversation_history, prompt_tokens, history_size = build_conversation(state, character, message)
+    # Don't hold a read transaction open for the length of the stream
+    db.session.commit()
+
+    def events():
         try:
-            # Try to extract JSON from the response
-            import re
-            json_match = re.search(r'\{.*\}', mood_content, re.DOTALL)
-            if json_match:
-                mood_data = json.loads(json_match.group())
-            else:
-                # Fallback if no JSON found
-                mood_data = {"mood_score": 5, "self_reflection": "I am processing my emotions..."}
-        except (json.JSONDecodeError, Exception):
-            mood_data = {"mood_score": 5, "self_reflection": "I am processing my emotions..."}
-        mood_score = mood_data.get('mood_score', 5)
-        mood_reflection = mood_data.get('self_reflection', 'I am processing my emotions...')
-        
-        # Store AI message with mood data
-        ai_msg = Message(
-            session_id=session_id,
-            sender='ai',
-            content=ai_message,
-            timestamp=datetime.utcnow(),
-            mood_score=mood_score
-        )
-        db.session.add(ai_msg)
-        
-        # Update session's current mood
-        session.current_mood = mood_score
-        db.session.commit()
-        
+            usage = {}
+            tokens = []
+            for token in llm.stream(conversation_history, usage, call_site='reply'):
+                tokens.append(token)
+                yield sse_event('token', {'text': token})
+            ai_message = "".join(tokens)
+
+            # Both rows of the turn are written once the stream has finished
+            ai_msg, mood_future = store_turn(session_id, state['ai_character_id'], message, ai_message, received_at,
+                                             usage.get('prompt_tokens', prompt_tokens))
+            maybe_summarize(session_id, history_size + 2)
+            yield sse_event('done', with_trace(reply_payload(ai_msg, mood_future, data.get('wait_for_mood', MOOD_INLINE))))
+
+        except Exception as e:
+            logging.error("Error in streamed chat: %s", e)
+            logging.debug("Full exception details: %s", e, exc_info=True)
+            db.session.rollback()
+            body, status = llm_error_response(e, 'Failed to process chat message. Please try again.')
+            yield sse_event('error', dict(body, status=status))
+
+    return sse_response(events())
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Return runtime counters for the LLM scheduler and in-process caches"""
+    return jsonify({
+        'llm_scheduler': llm_scheduler.stats(),
+        'session_cache': session_cache.stats(),
+        'llm_cache': llm_cache.stats(),
+        'opening_pool': {'hits': opening_pool.hits, 'misses': opening_pool.misses}
+    })
+
+def collect_runtime_stats():
+    """Gauge samples for /metrics from the counters the caches and scheduler keep themselves"""
+    scheduler = llm_scheduler.stats()
+    yield 'llm_queue_depth', {}, scheduler['queue_depth']
+    for priority, values in scheduler['priorities'].items():
+        for key in ('admitted', 'retries', 'failures', 'timeouts'):
+            yield f'llm_scheduler_{key}', {'priority': priority}, values[key]
+        yield 'llm_scheduler_wait_seconds_avg', {'priority': priority}, values['wait_avg']
+
+    for call_site, values in llm_cache.stats()['call_sites'].items():
+        for result, count in values.items():
+            yield 'llm_cache_lookups', {'call_site': call_site, 'result': result}, count
+
+    cache = session_cache.stats()
+    for key in ('hits', 'misses', 'evictions', 'stale', 'sessions', 'bytes'):
+        yield f'session_cache_{key}', {}, cache[key]
+
+    yield 'opening_pool_hits', {}, opening_pool.hits
+    yield 'opening_pool_misses', {}, opening_pool.misses
+
+    # SQLite's default pool has no size to report
+    pool = db.engine.pool
+    if hasattr(pool, 'checkedout'):
+        yield 'db_pool_checked_out', {}, pool.checkedout()
+        yield 'db_pool_size', {}, pool.size()
+
+metrics.add_collector(collect_runtime_stats)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus-format metrics; ?format=json for the same data as JSON"""
+    if request.args.get('format') == 'json':
+        return jsonify(metrics.snapshot())
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/mood/<int:session_id>', methods=['GET'])
+def get_mood(session_id):
+    """Return the mood analysis for the latest (or a given) AI message"""
+    try:
+        query = Message.query.filter_by(session_id=session_id, sender='ai')
+        message_id = request.args.get('message_id', type=int)
+        if message_id:
+            ai_msg = query.filter_by(id=message_id).first()
+        else:
+            ai_msg = query.order_by(Message.id.desc()).first()
+        if ai_msg:
+            ai_msg = {'id': ai_msg.id, 'mood_score': ai_msg.mood_score, 'mood_reflection': ai_msg.mood_reflection}
+        else:
+            ai_msg = archived_ai_message(session_id, message_id)
+        if not ai_msg:
+            return jsonify({'error': 'Message not found'}), 404
+
         return jsonify({
-            'ai_response': ai_message,
-            'mood_score': mood_score,
-            'mood_reflection': mood_reflection
+            'message_id': ai_msg['id'],
+            'mood_pending': ai_msg['mood_score'] is None,
+            'mood_score': ai_msg['mood_score'],
+            'mood_reflection': ai_msg['mood_reflection']
         })
-        
+
     except Exception as e:
-        logging.error(f"Error in chat: {str(e)}")
-        logging.debug(f"Full exception details: {e}", exc_info=True)
-        error_message = str(e)
-        if "429" in error_message or "quota" in error_message.lower():
-            return jsonify({'error': 'Groq API rate limit exceeded. Please wait a moment and try again.'}), 429
-        elif "401" in error_message or "authentication" in error_message.lower():
-            return jsonify({'error': 'Groq API authentication failed. Please check your API key.'}), 401
-        else:
-            return jsonify({'error': 'Failed to process chat message. Please try again.'}), 500
+        logging.error("Error fetching mood: %s", e)
+        return jsonify({'error': 'Failed to fetch mood'}), 500
 
 @app.route('/end_session', methods=['POST'])
 def end_session():
@@ -352,17 +1137,428 @@ def end_session():
         if not session:
             return jsonify({'error': 'Invalid or inactive session'}), 400
         
-        session.end_time = datetime.utcnow()
-        session.status = 'completed'
-        session.final_mood = session.current_mood
-        db.session.commit()
+        complete_session(session)
         
         return jsonify({'message': 'Session ended successfully'})
         
     except Exception as e:
-        logging.error(f"Error ending session: {str(e)}")
+        logging.error("Error ending session: %s", e)
         return jsonify({'error': 'Failed to end session'}), 500
 
+def recent_transcript(session, limit):
+    """The last limit messages not folded into the summary, oldest first, from the message table or the archive"""
+    if session.archived_at is not None:
+        archive = db.session.get(SessionArchive, session.id)
+        rows = [msg for msg in unpack_transcript(archive.transcript)
+                if not session.summary_through or msg['id'] > session.summary_through]
+        return rows[-limit:]
+    query = Message.query.filter(Message.session_id == session.id)
+    if session.summary_through:
+        query = query.filter(Message.id > session.summary_through)
+    recent = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit).all()
+    return [{'id': msg.id, 'sender': msg.sender, 'content': msg.content} for msg in reversed(recent)]
+
+def archived_ai_message(session_id, message_id=None):
+    """The latest (or a given) AI message of an archived session, as a dict, or None"""
+    archive = db.session.get(SessionArchive, session_id)
+    if archive is None:
+        return None
+    ai_messages = [msg for msg in unpack_transcript(archive.transcript) if msg['sender'] == 'ai']
+    if message_id:
+        ai_messages = [msg for msg in ai_messages if msg['id'] == message_id]
+    return max(ai_messages, key=lambda msg: msg['id']) if ai_messages else None
+
+REPORT_FIELDS = ('key_issues', 'therapist_effectiveness', 'ai_progress', 'next_steps', 'session_summary')
+# The page renders these as lists; the other fields are plain text
+REPORT_LIST_FIELDS = ('key_issues', 'next_steps')
+
+def valid_report_fields(report):
+    """The REPORT_FIELDS of a model-written report that have the shape the page expects"""
+    if not isinstance(report, dict):
+        return {}
+    valid = {}
+    for key in REPORT_FIELDS:
+        value = report.get(key)
+        if key in REPORT_LIST_FIELDS:
+            if isinstance(value, list) and value and all(isinstance(item, str) for item in value):
+                valid[key] = value
+        elif isinstance(value, str) and value.strip():
+            valid[key] = value
+    return valid
+
+def generate_session_report(session):
+    """Ask the model for the narrative part of a session report"""
+    character = AI_CHARACTERS[session.ai_character_id]
+
+    # Older turns are covered by the running summary, so only recent messages are read
+    messages = [
+        {"role": "assistant" if msg["sender"] == "ai" else "user", "content": msg["content"]}
+        for msg in recent_transcript(session, REPORT_TRANSCRIPT_MESSAGES)
+    ]
+
+    report_response = llm.complete(
+        report_prompt(character, session.summary, messages, session.initial_mood or 3,
+                      session.final_mood or session.current_mood or 5, budget=REPORT_TRANSCRIPT_TOKENS),
+        priority=BACKGROUND,
+        call_site='report'
+    )
+    # Try to extract JSON from the response
+    json_match = re.search(r'\{.*\}', report_response.text or "", re.DOTALL)
+    report = valid_report_fields(json.loads(json_match.group()) if json_match else {})
+    if not report:
+        raise ValueError("Report response contained none of the expected fields")
+    return report
+
+def run_report_job(job_id):
+    """Worker task: claim a pending report job, generate the report and store it"""
+    with app.app_context():
+        try:
+            # Claiming is a conditional update, so a job is only ever run by one worker
+            claimed = ReportJob.query.filter_by(id=job_id, status='pending').update({
+                'status': 'running',
+                'started_at': datetime.utcnow(),
+                'attempts': ReportJob.attempts + 1
+            }, synchronize_session=False)
+            db.session.commit()
+            if not claimed:
+                return
+
+            job = db.session.get(ReportJob, job_id)
+            session = db.session.get(Session, job.session_id)
+            try:
+                # The report's mood figures come from the aggregates, so moods a lost worker never wrote go in first
+                score_lost_moods(session.id)
+                report = generate_session_report(session)
+            except Exception as e:
+                logging.error("Report generation for session %s failed: %s", job.session_id, e)
+                job.error = str(e)
+                if job.attempts < REPORT_MAX_ATTEMPTS:
+                    job.status = 'pending'
+                else:
+                    job.status = 'failed'
+                    job.finished_at = datetime.utcnow()
+                db.session.commit()
+                if job.status == 'pending':
+                    queue_report_job(job_id)
+                return
+
+            job.report = json.dumps(report)
+            job.status = 'done'
+            job.error = None
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            logging.error("Report job %s failed: %s", job_id, e)
+            db.session.rollback()
+        finally:
+            db.session.remove()
+
+def queue_report_job(job_id):
+    report_executor.submit(run_report_job, job_id)
+
+def report_job_for(session_id):
+    """Return the report job of a completed session, creating one if it has none"""
+    job = ReportJob.query.filter_by(session_id=session_id).first()
+    if job:
+        if report_job_stale(job):
+            requeue_stale_report_jobs()
+        return job
+    # Sessions completed before report jobs existed get one on first request
+    job = ReportJob(session_id=session_id)
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request created it first
+        db.session.rollback()
+        return ReportJob.query.filter_by(session_id=session_id).first()
+    queue_report_job(job.id)
+    return job
+
+def report_job_stale(job):
+    """Whether a job has been running for so long that its worker must have died"""
+    stale = datetime.utcnow() - timedelta(seconds=REPORT_STALE_SECONDS)
+    return job.status == 'running' and job.started_at is not None and job.started_at < stale
+
+def requeue_stale_report_jobs():
+    """Put jobs stuck running back in the queue, or fail them once they are out of attempts.
+
+    Runs on every reaper pass and whenever /session_report finds a stale job,
+    so a crashed worker's job doesn't wait for the next process to start.
+    """
+    stale = datetime.utcnow() - timedelta(seconds=REPORT_STALE_SECONDS)
+    stuck = ReportJob.query.filter(ReportJob.status == 'running', ReportJob.started_at < stale)
+    stuck.filter(ReportJob.attempts >= REPORT_MAX_ATTEMPTS).update({
+        'status': 'failed',
+        'finished_at': datetime.utcnow(),
+        'error': 'Worker stopped while generating the report'
+    }, synchronize_session=False)
+    job_ids = [job_id for (job_id,) in stuck.with_entities(ReportJob.id).all()]
+    if job_ids:
+        # Repeats the stale check, so a job another process requeued and restarted meanwhile is left alone
+        stuck.filter(ReportJob.id.in_(job_ids)).update({'status': 'pending'}, synchronize_session=False)
+    db.session.commit()
+    # Running a job twice is prevented by the claim in run_report_job()
+    for job_id in job_ids:
+        queue_report_job(job_id)
+    return len(job_ids)
+
+def recover_report_jobs():
+    """Requeue jobs left pending, or stuck running, by a process that exited"""
+    requeue_stale_report_jobs()
+    for (job_id,) in db.session.query(ReportJob.id).filter_by(status='pending').all():
+        queue_report_job(job_id)
+
+def session_last_activity():
+    """SQL expression for when a session was last used; sessions from before last_activity
+    was recorded fall back to their newest message"""
+    newest_message = select(func.max(Message.timestamp)).where(Message.session_id == Session.id).scalar_subquery()
+    return func.coalesce(Session.last_activity, newest_message, Session.start_time)
+
+def score_lost_moods(session_id=None):
+    """Score AI messages whose mood never arrived with the lexicon scorer; returns how many were stored"""
+    cutoff = datetime.utcnow() - timedelta(seconds=MOOD_LOST_AFTER)
+    query = select(Message.session_id).where(
+        Message.sender == 'ai', Message.mood_score.is_(None), Message.timestamp < cutoff
+    )
+    if session_id is not None:
+        query = query.where(Message.session_id == session_id)
+    session_ids = db.session.execute(query.distinct().limit(REAPER_BATCH_SIZE)).scalars().all()
+
+    scored = 0
+    for session_id in session_ids:
+        session = db.session.get(Session, session_id)
+        messages = db.session.execute(
+            select(Message).where(Message.session_id == session_id).order_by(Message.timestamp, Message.id)
+        ).scalars().all()
+        # Each AI message is scored against the therapist message it answered
+        lost = []
+        therapist_message = ''
+        for msg in messages:
+            if msg.sender == 'human':
+                therapist_message = msg.content
+            elif msg.mood_score is None and msg.timestamp < cutoff:
+                lost.append((msg, therapist_message))
+        results = lexicon_scorer.score_transcript(session.ai_character_id,
+                                                  [(msg.content, message) for msg, message in lost])
+
+        newest_ai_id = max(msg.id for msg in messages if msg.sender == 'ai')
+        latest = None
+        for (msg, _), mood_data in zip(lost, results):
+            mood_score = mood_data['mood_score']
+            if db.session.execute(message_mood_update(msg.id, mood_score, mood_data['self_reflection'])).rowcount:
+                db.session.execute(session_mood_update(session_id, msg.id, mood_score))
+                scored += 1
+                if msg.id == newest_ai_id:
+                    latest = mood_score
+        if latest is not None:
+            apply_session_mood(session, latest)
+        db.session.commit()
+        if latest is not None:
+            session_cache.set_mood(session_id, latest)
+    return scored
+
+def abandon_idle_sessions():
+    """Mark active sessions idle for longer than SESSION_IDLE_TIMEOUT as abandoned"""
+    cutoff = datetime.utcnow() - timedelta(seconds=SESSION_IDLE_TIMEOUT)
+    last_activity = session_last_activity()
+    idle_ids = [session_id for (session_id,) in db.session.query(Session.id)
+                .filter(Session.status == 'active', last_activity < cutoff)
+                .limit(REAPER_BATCH_SIZE).all()]
+    if not idle_ids:
+        return 0
+    # The idle check is repeated in the update so a turn stored meanwhile keeps its session active
+    abandoned = Session.query.filter(
+        Session.id.in_(idle_ids), Session.status == 'active', last_activity < cutoff
+    ).update({
+        'status': 'abandoned',
+        'end_time': last_activity,
+        'final_mood': Session.current_mood
+    }, synchronize_session=False)
+    db.session.commit()
+    for session_id in idle_ids:
+        session_cache.invalidate(session_id)
+    return abandoned
+
+def archive_session(session_id):
+    """Move an ended session's messages into a SessionArchive row; False if it was already archived"""
+    now = datetime.utcnow()
+    # Claiming is a conditional update, so concurrent reapers never archive a session twice
+    claimed = Session.query.filter_by(id=session_id, archived_at=None).update(
+        {'archived_at': now}, synchronize_session=False
+    )
+    if not claimed:
+        db.session.rollback()
+        return False
+
+    session = db.session.get(Session, session_id)
+    # Aggregates can't be computed from the messages once they are gone
+    if session.message_count is None:
+        backfill_session_stats(db.session, session)
+    messages = Message.query.filter_by(session_id=session_id).order_by(Message.timestamp, Message.id).all()
+    db.session.add(SessionArchive(
+        session_id=session_id,
+        archived_at=now,
+        message_count=len(messages),
+        transcript=pack_transcript(messages)
+    ))
+    Message.query.filter_by(session_id=session_id).delete(synchronize_session=False)
+    db.session.commit()
+    return True
+
+def archive_ended_sessions():
+    """Archive completed and abandoned sessions that ended more than SESSION_ARCHIVE_AFTER seconds ago"""
+    cutoff = datetime.utcnow() - timedelta(seconds=SESSION_ARCHIVE_AFTER)
+    # A report being written still reads the message table
+    report_in_progress = exists().where(
+        ReportJob.session_id == Session.id, ReportJob.status.in_(('pending', 'running'))
+    )
+    session_ids = [session_id for (session_id,) in db.session.query(Session.id)
+                   .filter(Session.archived_at.is_(None), Session.status.in_(('completed', 'abandoned')),
+                           Session.end_time < cutoff, ~report_in_progress)
+                   .order_by(Session.end_time)
+                   .limit(REAPER_BATCH_SIZE).all()]
+    archived = 0
+    for session_id in session_ids:
+        try:
+            archived += archive_session(session_id)
+        except Exception as e:
+            logging.error("Archiving session %s failed: %s", session_id, e)
+            db.session.rollback()
+    return archived
+
+def reap_sessions():
+    """One reaper pass: requeue stuck report jobs, score lost moods, abandon idle sessions, then archive ended ones"""
+    with app.app_context():
+        try:
+            requeue_stale_report_jobs()
+            metrics.inc('moods_rescored_total', score_lost_moods())
+            if SESSION_IDLE_TIMEOUT > 0:
+                abandoned = abandon_idle_sessions()
+                metrics.inc('sessions_abandoned_total', abandoned)
+            if SESSION_ARCHIVE_AFTER > 0:
+                archived = archive_ended_sessions()
+                metrics.inc('sessions_archived_total', archived)
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+session_reaper = Reaper(reap_sessions, interval=REAPER_INTERVAL)
+
+imported_pid = os.getpid()
+started_pid = None
+start_lock = threading.Lock()
+
+def start_process():
+    """Start this process's background work: the opening pool, the reaper and report recovery.
+
+    Runs on the first request a process serves rather than at import, so a
+    pre-forking server can import the app in its master and every worker
+    still gets its own threads and database connections.
+    """
+    global started_pid
+    if started_pid == os.getpid():
+        return
+    with start_lock:
+        if started_pid == os.getpid():
+            return
+        with app.app_context():
+            if os.getpid() != imported_pid:
+                # Pooled connections inherited across fork() belong to the parent
+                db.engine.dispose(close=False)
+            # A failed recovery is logged once per process rather than failing every request
+            try:
+                if inspect(db.engine).has_table(ReportJob.__tablename__):
+                    recover_report_jobs()
+                else:
+                    logging.error("Database schema is missing; create it with: flask --app app init-db")
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                logging.error("Report job recovery failed: %s", e)
+        opening_pool.start()
+        session_reaper.start()
+        started_pid = os.getpid()
+
+app.before_request(start_process)
+
+def create_app():
+    """Application factory for WSGI servers: gunicorn -w 4 'app:create_app()'
+
+    Importing the app only configures it; connections, LLM clients and worker
+    threads are created per process on first use (see start_process()). Create
+    the schema beforehand with: flask --app app init-db
+    """
+    return app
+
+def mood_trajectory_scores(trajectory):
+    """Scores from a Session.mood_trajectory string, in message order"""
+    points = []
+    for item in (trajectory or '').split(','):
+        # Entries written before scores were validated may not be "int:int"; they are skipped
+        try:
+            msg_id, score = item.split(':')
+            points.append((int(msg_id), int(score)))
+        except ValueError:
+            continue
+    return [score for _, score in sorted(points)]
+
+def average(total, count, digits=1):
+    return round(total / count, digits) if total is not None and count else None
+
+def build_session_report(session, job=None):
+    """Assemble the report body for a completed session from its aggregates and finished report job"""
+    character = AI_CHARACTERS[session.ai_character_id]
+    # Reports stored before fields were validated are checked again here
+    narrative = valid_report_fields(json.loads(job.report)) if job is not None and job.status == 'done' else {}
+
+    duration = session.end_time - session.start_time
+    duration_minutes = int(duration.total_seconds() / 60)
+
+    initial_mood = session.initial_mood or 3
+    final_mood = session.final_mood or session.current_mood or 5
+    turns = session.turn_count or 0
+    # The opening exchange is one message from each side, and every turn adds one more of each
+    exchanges = turns + 1
+
+    report_data = {
+        "patient_name": character['name'],
+        "session_duration": f"{duration_minutes} minutes",
+        "initial_mood_score": initial_mood,
+        "final_mood_score": final_mood,
+        "key_issues": ["Therapy session conducted", "AI patient interaction", "Emotional support provided"],
+        "therapist_effectiveness": "The therapist provided supportive interaction during the session.",
+        "ai_progress": f"Mood moved from {initial_mood} to {final_mood} over {turns} turns "
+                       f"(lowest {session.mood_min}, highest {session.mood_max}).",
+        "next_steps": ["Continue regular therapy sessions", "Monitor emotional progress", "Focus on specific concerns"],
+        "session_summary": f"A {duration_minutes}-minute session with {character['name']} "
+                           f"covering {turns} exchanges after the opening."
+    }
+    # The model-written sections replace the fallbacks once the report job has finished
+    report_data.update(narrative)
+
+    # Add metadata to report
+    report_data.update({
+        'session_id': session.id,
+        'start_time': session.start_time.strftime('%Y-%m-%d %H:%M:%S UTC'),
+        'end_time': session.end_time.strftime('%Y-%m-%d %H:%M:%S UTC'),
+        'duration_minutes': duration_minutes,
+        'total_messages': session.message_count,
+        'turn_count': turns,
+        'mood_trajectory': mood_trajectory_scores(session.mood_trajectory),
+        'mood_min': session.mood_min,
+        'mood_max': session.mood_max,
+        'mood_mean': average(session.mood_total, session.mood_count),
+        'avg_therapist_message_length': average(session.human_chars, exchanges),
+        'avg_patient_message_length': average(session.ai_chars, exchanges),
+        'avg_response_latency_ms': average(session.latency_total_ms, turns),
+        'max_response_latency_ms': session.latency_max_ms if turns else None,
+        'character_description': character['description'],
+        'report_status': 'ready' if narrative else 'failed'
+    })
+    return report_data
+
 @app.route('/session_report/<int:session_id>', methods=['GET'])
 def session_report(session_id):
     """Generate comprehensive AI Mental Health Report"""
@@ -370,71 +1566,86 @@ def session_report(session_id):
         session = Session.query.filter_by(id=session_id, status='completed').first()
         if not session:
             return jsonify({'error': 'Session not found or not completed'}), 404
-        
-        # Get all messages from session
-        messages = Message.query.filter_by(session_id=session_id).order_by(Message.timestamp).all()
-        character = AI_CHARACTERS[session.ai_character_id]
-        
-        # Build conversation transcript
-        transcript = []
-        for msg in messages:
-            transcript.append(f"{'Therapist' if msg.sender == 'human' else character['name']}: {msg.content}")
-        
-        full_transcript = "\n\n".join(transcript)
-        
-        # Skip AI generation for reports to prevent getting stuck - use reliable fallback
-        report_response = None
-        
-        # Calculate session duration first
-        duration = session.end_time - session.start_time
-        duration_minutes = int(duration.total_seconds() / 60)
-        
-        # Try to parse API response if we got one
-        if report_response:
-            report_content = report_response.choices[0].message.content or "{}"
-            try:
-                # Try to extract JSON from the response
-                import re
-                json_match = re.search(r'\{.*\}', report_content, re.DOTALL)
-                if json_match:
-                    basic_report = json.loads(json_match.group())
-                else:
-                    basic_report = {}
-            except (json.JSONDecodeError, Exception):
-                basic_report = {}
-        else:
-            basic_report = {}
-            
-        # Always create a complete report structure
-        report_data = {
-            "patient_name": basic_report.get("patient_name", character['name']),
-            "session_duration": f"{duration_minutes} minutes",
-            "initial_mood_score": session.initial_mood or 3,
-            "final_mood_score": session.final_mood or session.current_mood or 5,
-            "key_issues": basic_report.get("key_issues", ["Therapy session conducted", "AI patient interaction", "Emotional support provided"]),
-            "therapist_effectiveness": basic_report.get("therapist_effectiveness", "The therapist provided supportive interaction during the session."),
-            "ai_progress": basic_report.get("ai_progress", "The AI patient engaged in the therapeutic conversation."),
-            "next_steps": basic_report.get("next_steps", ["Continue regular therapy sessions", "Monitor emotional progress", "Focus on specific concerns"]),
-            "session_summary": basic_report.get("session_summary", "A therapy session was completed with positive engagement from both parties.")
-        }
 
+        # Sessions from before the aggregates existed are computed once from their messages
+        if session.message_count is None:
+            backfill_session_stats(db.session, session)
+            db.session.commit()
 
-        
-        # Add metadata to report
-        report_data.update({
-            'session_id': session_id,
-            'start_time': session.start_time.strftime('%Y-%m-%d %H:%M:%S UTC'),
-            'end_time': session.end_time.strftime('%Y-%m-%d %H:%M:%S UTC'),
-            'duration_minutes': duration_minutes,
-            'total_messages': len(messages),
-            'character_description': character['description']
-        })
-        
-        return jsonify(report_data)
+        # The client polls while the report job is queued or running
+        job = report_job_for(session.id)
+        if job.status in ('pending', 'running'):
+            return jsonify({'session_id': session.id, 'report_status': 'pending'}), 202
+
+        return jsonify(build_session_report(session, job))
         
     except Exception as e:
-        logging.error(f"Error generating session report: {str(e)}")
+        logging.error("Error generating session report: %s", e)
         return jsonify({'error': 'Failed to generate session report'}), 500
 
+# Upper bounds (exclusive) of the session length buckets reported by /analytics, in turns
+SESSION_LENGTH_BUCKETS = [5, 10, 20, 50]
+
+def session_length_labels():
+    bounds = [0] + SESSION_LENGTH_BUCKETS
+    return [f"{lower}-{upper - 1}" for lower, upper in zip(bounds, SESSION_LENGTH_BUCKETS)] + \
+        [f"{SESSION_LENGTH_BUCKETS[-1]}+"]
+
+def session_length_bucket(labels):
+    """SQL expression labelling a session with its SESSION_LENGTH_BUCKETS bucket"""
+    whens = [(Session.turn_count < upper, label) for upper, label in zip(SESSION_LENGTH_BUCKETS, labels)]
+    return case(*whens, else_=labels[-1])
+
+@app.route('/analytics', methods=['GET'])
+def analytics():
+    """Mood change per character and session length distribution over completed sessions"""
+    try:
+        completed = Session.status == 'completed'
+        mood_delta = Session.final_mood - Session.initial_mood
+        per_character = db.session.query(
+            Session.ai_character_id,
+            func.count(Session.id),
+            func.avg(mood_delta),
+            func.min(mood_delta),
+            func.max(mood_delta),
+            func.avg(Session.turn_count),
+            func.sum(Session.mood_total),
+            func.sum(Session.mood_count)
+        ).filter(completed).group_by(Session.ai_character_id).all()
+
+        characters = []
+        for character_id, sessions, avg_delta, min_delta, max_delta, avg_turns, mood_total, mood_count in per_character:
+            character = AI_CHARACTERS.get(character_id, {})
+            characters.append({
+                'ai_character_id': character_id,
+                'name': character.get('name'),
+                'sessions': sessions,
+                'avg_mood_delta': round(float(avg_delta), 2) if avg_delta is not None else None,
+                'min_mood_delta': min_delta,
+                'max_mood_delta': max_delta,
+                'avg_turns': round(float(avg_turns), 1) if avg_turns is not None else None,
+                'avg_mood': average(mood_total, mood_count, 2)
+            })
+
+        # Sessions that have not been backfilled yet have no turn count and are left out
+        labels = session_length_labels()
+        bucket = session_length_bucket(labels)
+        counts = dict(
+            db.session.query(bucket, func.count(Session.id))
+            .filter(completed, Session.turn_count.isnot(None))
+            .group_by(bucket)
+            .all()
+        )
+        return jsonify({
+            'completed_sessions': sum(c['sessions'] for c in characters),
+            'characters': characters,
+            'session_lengths': [{'turns': label, 'sessions': counts.get(label, 0)} for label in labels]
+        })
+
+    except Exception as e:
+        logging.error("Error computing analytics: %s", e)
+        return jsonify({'error': 'Failed to compute analytics'}), 500
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    init_db()
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get("FLASK_DEBUG", "0") == "1")
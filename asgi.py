@@ -0,0 +1,364 @@
+"""Async serving mode: ASGI app with an async Groq client and async DB sessions.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+/start_session, /chat, /end_session and /session_report keep the JSON contract
+of the Flask routes in app.py but never block a worker on LLM or DB I/O, so one
+process can multiplex many in-flight LLM calls. Every other route (pages,
+streaming variants, /mood, /stats) is served by the Flask app mounted below.
+Needs starlette, aiosqlite (or asyncpg for Postgres) and an ASGI server.
+Create the schema first with: flask --app app init-db
+"""
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+from app import (
+    AI_CHARACTERS, DEFAULT_MOOD_REFLECTION, DEFAULT_MOOD_SCORE, MOOD_INLINE, MOOD_SCORER, MOOD_WAIT_TIMEOUT,
+    SESSION_CACHE_VALIDATE, app as flask_app, apply_session_mood, backfill_session_stats, build_conversation,
+    build_session_report, cache_opened_session, cache_session_state, cache_turn, db, initial_mood_messages,
+    lexicon_scorer, llm, llm_error_response, maybe_summarize, message_mood_update, metrics, mood_analysis_messages,
+    new_session_row, newer_ai_message_query, opening_message_rows, opening_messages, parse_mood_json,
+    queue_report_job, recent_messages_query, report_job_stale, requeue_stale_report_jobs, session_cache,
+    session_mood_update, session_started_payload, session_version_query, start_process, start_session_stats,
+    take_opening, turn_message_rows, turn_session_update
+)
+from database import configure_sqlite, instrument_engine
+from llm_scheduler import MOOD
+from models import Message, ReportJob, Session
+
+
+def async_database_url(url):
+    """Map the app's sync database URL onto its async driver"""
+    url = make_url(url)
+    if url.drivername == "sqlite":
+        database = url.database
+        # Flask-SQLAlchemy resolves relative SQLite paths against the instance folder
+        if database and database != ":memory:" and not os.path.isabs(database):
+            database = os.path.join(flask_app.instance_path, database)
+        return url.set(drivername="sqlite+aiosqlite", database=database)
+    if url.drivername in ("postgres", "postgresql", "postgresql+psycopg2"):
+        return url.set(drivername="postgresql+asyncpg")
+    return url
+
+
+engine = create_async_engine(async_database_url(flask_app.config["SQLALCHEMY_DATABASE_URI"]),
+                             **flask_app.config["SQLALCHEMY_ENGINE_OPTIONS"])
+configure_sqlite(engine.sync_engine, synchronous=os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"))
+instrument_engine(engine.sync_engine, metrics)
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+# Strong references to fire-and-forget mood tasks so they are not garbage collected
+background_tasks = set()
+
+
+async def analyze_initial_mood(character):
+    if MOOD_SCORER == "lexicon":
+        return lexicon_scorer.initial(character["id"])
+    response = await llm.acomplete(initial_mood_messages(character), call_site="initial_mood")
+    return parse_mood_json(response.text, 3, "Starting therapy session...")
+
+
+async def generate_opening(character):
+    mood_data, opening = await asyncio.gather(
+        analyze_initial_mood(character),
+        llm.acomplete(opening_messages(character), call_site="opening")
+    )
+    return mood_data, opening.text
+
+
+async def load_session_state(db_session, session_id):
+    """Async counterpart of app.load_session_state()"""
+    try:
+        session_id = int(session_id)
+    except (TypeError, ValueError):
+        return None
+
+    state = session_cache.get(session_id)
+    if state is not None:
+        if not SESSION_CACHE_VALIDATE:
+            return state
+        row = (await db_session.execute(session_version_query(session_id))).first()
+        if row is None:
+            session_cache.invalidate(session_id)
+            return None
+        if session_cache.is_current(session_id, *row):
+            return state
+
+    session = (await db_session.execute(
+        select(Session).filter_by(id=session_id, status="active")
+    )).scalar_one_or_none()
+    if not session:
+        return None
+    if session.message_count is None:
+        await db_session.run_sync(backfill_session_stats, session)
+        await db_session.commit()
+
+    recent = (await db_session.execute(recent_messages_query(session))).scalars().all()
+    return cache_session_state(session, recent)
+
+
+async def score_message_mood(ai_msg_id, character, ai_message, message):
+    """Async counterpart of app.score_message_mood()"""
+    try:
+        response = await llm.acomplete(mood_analysis_messages(character, ai_message, message), priority=MOOD,
+                                      call_site="mood")
+        mood_data = parse_mood_json(response.text, DEFAULT_MOOD_SCORE, DEFAULT_MOOD_REFLECTION)
+    except Exception as e:
+        logging.error("Mood analysis failed for message %s: %s", ai_msg_id, e)
+        mood_data = {}
+
+    mood_score = mood_data.get("mood_score", DEFAULT_MOOD_SCORE)
+    mood_reflection = mood_data.get("self_reflection", DEFAULT_MOOD_REFLECTION)
+    latest = False
+    async with SessionLocal() as db_session:
+        ai_msg = await db_session.get(Message, ai_msg_id)
+        if (await db_session.execute(message_mood_update(ai_msg_id, mood_score, mood_reflection))).rowcount:
+            await db_session.execute(session_mood_update(ai_msg.session_id, ai_msg_id, mood_score))
+            latest = (await db_session.execute(newer_ai_message_query(ai_msg))).first() is None
+            if latest:
+                apply_session_mood(await db_session.get(Session, ai_msg.session_id), mood_score)
+        await db_session.commit()
+        # Read back, in case the message had been scored already
+        await db_session.refresh(ai_msg)
+    if latest:
+        session_cache.set_mood(ai_msg.session_id, mood_score)
+    return {"mood_score": ai_msg.mood_score, "mood_reflection": ai_msg.mood_reflection}
+
+
+async def json_object(request):
+    """The request body as a dict, or None if it isn't a JSON object"""
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def invalid_body():
+    return JSONResponse({"error": "Request body must be a JSON object"}, status_code=400)
+
+
+async def start_session(request):
+    """Start a new therapy session with an AI character"""
+    data = await json_object(request)
+    if data is None:
+        return invalid_body()
+    ai_character_id = data.get("ai_character_id")
+    if ai_character_id not in AI_CHARACTERS:
+        return JSONResponse({"error": "Invalid AI character"}, status_code=400)
+
+    character = AI_CHARACTERS[ai_character_id]
+    try:
+        opening = take_opening(ai_character_id)
+        mood_data, ai_message = opening if opening else await generate_opening(character)
+
+        async with SessionLocal() as db_session:
+            session = new_session_row(ai_character_id, mood_data)
+            db_session.add(session)
+            await db_session.flush()
+            human_msg, ai_msg = opening_message_rows(session, mood_data, ai_message)
+            db_session.add_all([human_msg, ai_msg])
+            await db_session.flush()
+            start_session_stats(session, ai_msg.id, ai_message)
+            await db_session.commit()
+
+        cache_opened_session(session, human_msg, ai_msg)
+        return JSONResponse(session_started_payload(session, character, ai_message, mood_data))
+
+    except Exception as e:
+        logging.error("Error starting session: %s", e)
+        body, status = llm_error_response(e, "Failed to start session. Please try again.")
+        return JSONResponse(body, status_code=status)
+
+
+async def chat(request):
+    """Handle chat messages between human therapist and AI patient"""
+    data = await json_object(request)
+    if data is None:
+        return invalid_body()
+    session_id = data.get("session_id")
+    message = data.get("message")
+    if not session_id or not message:
+        return JSONResponse({"error": "Missing session_id or message"}, status_code=400)
+
+    try:
+        async with SessionLocal() as db_session:
+            state = await load_session_state(db_session, session_id)
+        if not state:
+            return JSONResponse({"error": "Invalid or inactive session"}, status_code=400)
+        session_id = state["session_id"]
+        received_at = datetime.utcnow()
+        character = AI_CHARACTERS[state["ai_character_id"]]
+
+        conversation_history, prompt_tokens, history_size = build_conversation(state, character, message)
+        ai_response = await llm.acomplete(conversation_history, call_site="reply")
+        ai_message = ai_response.text
+        if ai_response.prompt_tokens is not None:
+            prompt_tokens = ai_response.prompt_tokens
+
+        async with SessionLocal() as db_session:
+            human_msg, ai_msg = turn_message_rows(session_id, character["id"], message, ai_message, received_at,
+                                                  prompt_tokens)
+            db_session.add_all([human_msg, ai_msg])
+            await db_session.flush()
+            await db_session.execute(turn_session_update(human_msg, ai_msg))
+            await db_session.commit()
+
+        cache_turn(human_msg, ai_msg)
+        maybe_summarize(session_id, history_size + 2)
+
+        mood_score = ai_msg.mood_score
+        mood_reflection = ai_msg.mood_reflection
+        if mood_score is None:
+            task = asyncio.create_task(score_message_mood(ai_msg.id, character, ai_message, message))
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+            if data.get("wait_for_mood", MOOD_INLINE):
+                try:
+                    mood_result = await asyncio.wait_for(asyncio.shield(task), MOOD_WAIT_TIMEOUT)
+                    mood_score = mood_result["mood_score"]
+                    mood_reflection = mood_result["mood_reflection"]
+                except Exception as e:
+                    logging.error("Waiting for mood analysis failed: %s", e)
+
+        return JSONResponse({
+            "ai_response": ai_message,
+            "message_id": ai_msg.id,
+            "mood_pending": mood_score is None,
+            "mood_score": mood_score,
+            "mood_reflection": mood_reflection,
+            "prompt_tokens": prompt_tokens
+        })
+
+    except Exception as e:
+        logging.error("Error in chat: %s", e)
+        body, status = llm_error_response(e, "Failed to process chat message. Please try again.")
+        return JSONResponse(body, status_code=status)
+
+
+async def end_session(request):
+    """End the current therapy session"""
+    data = await json_object(request)
+    if data is None:
+        return invalid_body()
+    try:
+        async with SessionLocal() as db_session:
+            session = (await db_session.execute(
+                select(Session).filter_by(id=data.get("session_id"), status="active")
+            )).scalar_one_or_none()
+            if not session:
+                return JSONResponse({"error": "Invalid or inactive session"}, status_code=400)
+
+            session.end_time = datetime.utcnow()
+            session.status = "completed"
+            session.final_mood = session.current_mood
+            job = ReportJob(session_id=session.id)
+            db_session.add(job)
+            await db_session.commit()
+        session_cache.invalidate(session.id)
+        # Reports are generated by the same worker pool as in the Flask app
+        queue_report_job(job.id)
+        return JSONResponse({"message": "Session ended successfully"})
+
+    except Exception as e:
+        logging.error("Error ending session: %s", e)
+        return JSONResponse({"error": "Failed to end session"}, status_code=500)
+
+
+def requeue_stale_report_jobs_task():
+    with flask_app.app_context():
+        try:
+            requeue_stale_report_jobs()
+        finally:
+            db.session.remove()
+
+
+async def report_job_for(db_session, session_id):
+    """Async counterpart of app.report_job_for()"""
+    query = select(ReportJob).filter_by(session_id=session_id)
+    job = (await db_session.execute(query)).scalar_one_or_none()
+    if job:
+        if report_job_stale(job):
+            await asyncio.to_thread(requeue_stale_report_jobs_task)
+        return job
+    job = ReportJob(session_id=session_id)
+    db_session.add(job)
+    try:
+        await db_session.commit()
+    except IntegrityError:
+        await db_session.rollback()
+        return (await db_session.execute(query)).scalar_one()
+    queue_report_job(job.id)
+    return job
+
+
+async def session_report(request):
+    """Generate comprehensive AI Mental Health Report"""
+    session_id = request.path_params["session_id"]
+    try:
+        async with SessionLocal() as db_session:
+            session = (await db_session.execute(
+                select(Session).filter_by(id=session_id, status="completed")
+            )).scalar_one_or_none()
+            if not session:
+                return JSONResponse({"error": "Session not found or not completed"}, status_code=404)
+            if session.message_count is None:
+                await db_session.run_sync(backfill_session_stats, session)
+                await db_session.commit()
+            job = await report_job_for(db_session, session.id)
+        if job.status in ("pending", "running"):
+            return JSONResponse({"session_id": session.id, "report_status": "pending"}, status_code=202)
+        return JSONResponse(build_session_report(session, job))
+
+    except Exception as e:
+        logging.error("Error generating session report: %s", e)
+        return JSONResponse({"error": "Failed to generate session report"}, status_code=500)
+
+
+def timed(route, endpoint):
+    """Record latency and status of an async route in the shared /metrics registry"""
+    async def handler(request):
+        start = time.perf_counter()
+        response = await endpoint(request)
+        metrics.observe("http_request_seconds", time.perf_counter() - start, route=route, method=request.method)
+        metrics.inc("http_requests_total", route=route, method=request.method, status=str(response.status_code))
+        return response
+    return handler
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    # Native routes don't pass through Flask's before_request hook
+    start_process()
+    yield
+    await engine.dispose()
+
+
+application = Starlette(
+    routes=[
+        Route("/start_session", timed("/start_session", start_session), methods=["POST"]),
+        Route("/chat", timed("/chat", chat), methods=["POST"]),
+        Route("/end_session", timed("/end_session", end_session), methods=["POST"]),
+        Route("/session_report/{session_id:int}", timed("/session_report/<int:session_id>", session_report),
+              methods=["GET"]),
+        Mount("/", app=WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,145 @@
+"""Chat-turn and report latency against a message table with millions of rows.
+
+Seeds a database with --messages messages spread over --seed-sessions sessions
+(skipped if it is already seeded), then times /chat turns on random active
+sessions and /session_report on random completed ones, in-process with the
+fake LLM backend at zero latency so the numbers are dominated by the database.
+The session cache is dropped before every turn so each one reads its history
+from the database, as after a restart or on another worker.
+
+    python benchmarks/db_bench.py --messages 2000000 --db /tmp/bench.db
+    python benchmarks/db_bench.py --db /tmp/bench.db --drop-indexes   # compare without indexes
+"""
+import os
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from load_test import THERAPIST_LINES, load_app, percentile
+
+BATCH_SIZE = 10000
+
+
+def seed(app_module, messages, sessions, rng):
+    """Bulk-insert sessions and their messages unless the database already has them"""
+    db, Session, Message = app_module.db, app_module.Session, app_module.Message
+    with app_module.app.app_context():
+        if db.session.query(Message.id).first() is not None:
+            print("Database already seeded")
+            return
+        per_session = max(2, messages // sessions)
+        start = time.perf_counter()
+        base = datetime.utcnow() - timedelta(days=30)
+        session_rows = []
+        for session_id in range(1, sessions + 1):
+            started = base + timedelta(seconds=session_id * 10)
+            completed = session_id % 2 == 0
+            session_rows.append({
+                "id": session_id,
+                "ai_character_id": rng.randint(1, 5),
+                "start_time": started,
+                "end_time": started + timedelta(minutes=20) if completed else None,
+                "status": "completed" if completed else "active",
+                "initial_mood": 3,
+                "current_mood": 5,
+                "final_mood": 5 if completed else None,
+            })
+        for i in range(0, len(session_rows), BATCH_SIZE):
+            db.session.execute(insert(Session), session_rows[i:i + BATCH_SIZE])
+
+        # Interleave sessions the way concurrent conversations would be written
+        rows = []
+        for n in range(per_session * sessions):
+            session_id = n % sessions + 1
+            turn = n // sessions
+            ai = turn % 2 == 1
+            rows.append({
+                "session_id": session_id,
+                "sender": "ai" if ai else "human",
+                "content": rng.choice(THERAPIST_LINES),
+                "timestamp": base + timedelta(seconds=session_id * 10 + turn),
+                "mood_score": rng.randint(1, 10) if ai else None,
+            })
+            if len(rows) == BATCH_SIZE:
+                db.session.execute(insert(Message), rows)
+                rows = []
+        if rows:
+            db.session.execute(insert(Message), rows)
+        db.session.commit()
+        print(f"Seeded {per_session * sessions} messages in {sessions} sessions "
+              f"in {time.perf_counter() - start:.1f}s")
+
+
+def drop_message_indexes(app_module):
+    with app_module.app.app_context():
+        for index in app_module.Message.__table__.indexes:
+            index.drop(bind=app_module.db.engine, checkfirst=True)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    status = fn()
+    return time.perf_counter() - start, status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="SQLite file to seed or reuse (default: DATABASE_URL or a temp file)")
+    parser.add_argument("--messages", type=int, default=2000000)
+    parser.add_argument("--seed-sessions", type=int, default=20000)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--reports", type=int, default=100)
+    parser.add_argument("--drop-indexes", action="store_true", help="drop the Message indexes before timing")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.db:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    os.environ.setdefault("FAKE_LLM_LATENCY", "0")
+    os.environ.setdefault("FAKE_LLM_TOKENS_PER_SECOND", "1000000")
+    os.environ.setdefault("MOOD_SCORER", "lexicon")
+    os.environ.setdefault("OPENING_POOL_DEPTH", "0")
+    # The seeded sessions are weeks old; keep the reaper from archiving them mid-run
+    os.environ.setdefault("REAPER_INTERVAL", "0")
+    app_module = load_app()
+    rng = random.Random(args.seed)
+
+    seed(app_module, args.messages, args.seed_sessions, rng)
+    if args.drop_indexes:
+        drop_message_indexes(app_module)
+
+    client = app_module.app.test_client()
+    active = [i for i in range(1, args.seed_sessions + 1) if i % 2 == 1]
+    completed = [i for i in range(1, args.seed_sessions + 1) if i % 2 == 0]
+    latencies = {"/chat": [], "/session_report": []}
+    errors = {"/chat": 0, "/session_report": 0}
+
+    for _ in range(args.turns):
+        session_id = rng.choice(active)
+        app_module.session_cache.invalidate(session_id)
+        elapsed, status = timed(lambda: client.post("/chat", json={
+            "session_id": session_id, "message": rng.choice(THERAPIST_LINES)
+        }).status_code)
+        latencies["/chat"].append(elapsed)
+        errors["/chat"] += status != 200
+
+    for _ in range(args.reports):
+        session_id = rng.choice(completed)
+        elapsed, status = timed(lambda: client.get(f"/session_report/{session_id}").status_code)
+        latencies["/session_report"].append(elapsed)
+        # The first report of a seeded session queues its report job and answers 202
+        errors["/session_report"] += status not in (200, 202)
+
+    print(f"\nindexes {'dropped' if args.drop_indexes else 'present'}")
+    print(f"{'route':<18}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, values in latencies.items():
+        values = sorted(values)
+        print(f"{route:<18}{len(values):>7}{errors[route]:>8}{percentile(values, 50) * 1000:>10.2f}"
+              f"{percentile(values, 95) * 1000:>10.2f}{percentile(values, 99) * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Drive concurrent simulated therapy sessions and report per-route latency.
+
+Each simulated session runs /start_session -> /chat x turns -> /end_session ->
+/session_report. By default the app is loaded in-process with the fake LLM
+backend and a throwaway SQLite database; pass --url to load-test a running
+server instead.
+
+    python benchmarks/load_test.py --sessions 200 --concurrency 20 --turns 5
+    python benchmarks/load_test.py --url http://localhost:5000 --sessions 50
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+THERAPIST_LINES = [
+    "How does that make you feel?",
+    "Can you tell me more about when this started?",
+    "What would help you feel safer right now?",
+    "That sounds really difficult. What do you need from me?",
+    "Have you noticed any patterns in these thoughts?",
+]
+
+REPORT_POLL_INTERVAL = 0.25
+REPORT_TIMEOUT = 120
+
+
+class HttpClient:
+    """Minimal JSON client for a running server"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=120) as resp:
+                return resp.status, json.loads(resp.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            return e.code, {}
+
+
+class InProcessClient:
+    """JSON client backed by the Flask test client"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.local = threading.local()
+
+    def request(self, method, path, body=None):
+        if not hasattr(self.local, "client"):
+            self.local.client = self.flask_app.test_client()
+        resp = self.local.client.open(path, method=method, json=body)
+        return resp.status_code, resp.get_json(silent=True) or {}
+
+
+class Recorder:
+    """Thread-safe latency and error bookkeeping per route"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def call(self, client, route, method, path, body=None):
+        start = time.perf_counter()
+        status, data = client.request(method, path, body)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.latencies[route].append(elapsed)
+            if status >= 400:
+                self.errors[route] += 1
+        return status, data
+
+
+def run_session(client, recorder, character_ids, turns, rng):
+    """One simulated session; returns True if it ran to the report"""
+    status, data = recorder.call(client, "/start_session", "POST", "/start_session",
+                                 {"ai_character_id": rng.choice(character_ids)})
+    if status != 200:
+        return False
+    session_id = data["session_id"]
+
+    for _ in range(turns):
+        recorder.call(client, "/chat", "POST", "/chat",
+                      {"session_id": session_id, "message": rng.choice(THERAPIST_LINES)})
+
+    status, _ = recorder.call(client, "/end_session", "POST", "/end_session", {"session_id": session_id})
+    if status != 200:
+        return False
+    # Reports are generated in the background; poll like the browser does
+    deadline = time.monotonic() + REPORT_TIMEOUT
+    while True:
+        status, _ = recorder.call(client, "/session_report", "GET", f"/session_report/{session_id}")
+        if status != 202 or time.monotonic() > deadline:
+            return status == 200
+        time.sleep(REPORT_POLL_INTERVAL)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def report(recorder, wall_time, completed, sessions):
+    print(f"\n{completed}/{sessions} sessions completed in {wall_time:.2f}s")
+    print(f"{'route':<18}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+    total = 0
+    for route, values in recorder.latencies.items():
+        values = sorted(values)
+        total += len(values)
+        print(f"{route:<18}{len(values):>7}{recorder.errors[route]:>8}"
+              f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}"
+              f"{percentile(values, 99) * 1000:>10.1f}{len(values) / wall_time:>9.1f}")
+    print(f"{'all':<18}{total:>7}{sum(recorder.errors.values()):>8}{'':>30}{total / wall_time:>9.1f}")
+
+
+def load_app():
+    """Import the app in-process with the fake backend and a temporary database"""
+    os.environ.setdefault("LLM_BACKEND", "fake")
+    # The fake backend has no quota; measure the server, not the client-side throttle
+    os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "0")
+    os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "0")
+    if "DATABASE_URL" not in os.environ:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="bot-breathe-bench-"), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import app as app_module
+    app_module.init_db()
+    return app_module
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="base URL of a running server (default: in-process with the fake backend)")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--characters", default="1,2,3,4,5", help="comma-separated AI_CHARACTERS ids")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.url:
+        client = HttpClient(args.url)
+    else:
+        client = InProcessClient(load_app().app)
+
+    character_ids = [int(c) for c in args.characters.split(",")]
+    recorder = Recorder()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [
+            pool.submit(run_session, client, recorder, character_ids, args.turns, random.Random(args.seed + i))
+            for i in range(args.sessions)
+        ]
+        completed = sum(1 for f in futures if f.result())
+    report(recorder, time.perf_counter() - start, completed, args.sessions)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Throughput and latency of the app served by 1, 2, 4 and 8 gunicorn workers.
+
+For each worker count a fresh SQLite database is created with init-db, the app
+is started with gunicorn -w N 'app:create_app()' and the fake LLM backend, and
+the load_test.py session script is run against it over HTTP. Requests are
+spread over the workers, so consecutive turns of a session land on different
+processes; the last column counts completed sessions whose stored message
+count is not what the script sent, which should always be 0. Needs gunicorn.
+
+    python benchmarks/scaling_bench.py --workers 1,2,4,8 --sessions 200 --concurrency 32
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from load_test import HttpClient, Recorder, percentile, run_session
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def server_env(db_path, latency):
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY": str(latency),
+        "LLM_REQUESTS_PER_MINUTE": "0",
+        "LLM_TOKENS_PER_MINUTE": "0",
+        "MOOD_SCORER": env.get("MOOD_SCORER", "lexicon"),
+        "OPENING_POOL_DEPTH": "0",
+        "LOG_LEVEL": "WARNING",
+    })
+    return env
+
+
+def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url + "/ai-characters", timeout=1) as resp:
+                if resp.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not come up")
+
+
+def miscounted_sessions(db_path, turns):
+    """Completed sessions whose message count doesn't match the turns that were sent"""
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM session WHERE status = 'completed' AND message_count != ?", (2 + 2 * turns,)
+        ).fetchone()[0]
+
+
+def run(workers, args):
+    db_path = os.path.join(tempfile.mkdtemp(prefix="bot-breathe-scaling-"), "scaling.db")
+    env = server_env(db_path, args.latency)
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app", "init-db"], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", str(workers), "--threads", str(args.threads),
+         "-b", f"127.0.0.1:{args.port}", "--log-level", "warning", "app:create_app()"],
+        cwd=ROOT, env=env
+    )
+    try:
+        wait_until_up(url)
+        client = HttpClient(url)
+        recorder = Recorder()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [
+                pool.submit(run_session, client, recorder, [1, 2, 3, 4, 5], args.turns, random.Random(args.seed + i))
+                for i in range(args.sessions)
+            ]
+            completed = sum(1 for f in futures if f.result())
+        wall_time = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    chat = sorted(recorder.latencies["/chat"])
+    requests = sum(len(values) for values in recorder.latencies.values())
+    return {
+        "workers": workers,
+        "completed": completed,
+        "errors": sum(recorder.errors.values()),
+        "req_s": requests / wall_time,
+        "chat_p50": percentile(chat, 50) * 1000,
+        "chat_p95": percentile(chat, 95) * 1000,
+        "miscounted": miscounted_sessions(db_path, args.turns),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4,8", help="comma-separated worker counts")
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM latency per call, in seconds")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    results = [run(int(n), args) for n in args.workers.split(",")]
+
+    print(f"\n{'workers':>7}{'sessions':>10}{'errors':>8}{'req/s':>9}{'chat p50':>10}{'chat p95':>10}"
+          f"{'miscounted':>12}")
+    for r in results:
+        print(f"{r['workers']:>7}{r['completed']:>6}/{args.sessions:<3}{r['errors']:>8}{r['req_s']:>9.1f}"
+              f"{r['chat_p50']:>10.1f}{r['chat_p95']:>10.1f}{r['miscounted']:>12}")
+
+
+if __name__ == "__main__":
+    main()
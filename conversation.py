@@ -0,0 +1,117 @@
+"""Token-budgeted conversation context for the AI patient model"""
+
+# Llama 3 averages roughly four characters per token for English prose. An
+# estimate is enough for budgeting; the exact count comes back in Groq's usage.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    """Approximate the number of tokens in a piece of text"""
+    return len(text or "") // CHARS_PER_TOKEN + 1
+
+
+def message_tokens(message):
+    """Approximate the prompt tokens used by one chat message"""
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def build_context(system_prompt, history, new_message, summary=None, budget=6144):
+    """Assemble the prompt for the next patient reply within a token budget.
+
+    history holds the not-yet-summarized {"role", "content"} messages of the
+    session, oldest first. The system prompt, the running summary and the new
+    message are always included; history is added newest first until the
+    budget is spent. Returns (messages, estimated_prompt_tokens).
+    """
+    system = {"role": "system", "content": system_prompt}
+    if summary:
+        system["content"] += "\n\nSummary of the session so far: " + summary
+    current = {"role": "user", "content": new_message}
+
+    used = message_tokens(system) + message_tokens(current)
+    kept = []
+    for msg in reversed(history):
+        cost = message_tokens(msg)
+        if used + cost > budget:
+            break
+        kept.append(msg)
+        used += cost
+    kept.reverse()
+
+    # The model expects alternating turns starting with the user
+    while kept and kept[0]["role"] != "user":
+        used -= message_tokens(kept.pop(0))
+
+    return [system] + kept + [current], used
+
+
+def summary_prompt(character_name, summary, messages):
+    """Prompt that folds older exchanges into the running session summary"""
+    transcript = "\n".join(
+        f"{'Therapist' if msg['role'] == 'user' else character_name}: {msg['content']}"
+        for msg in messages
+    )
+    return [
+        {
+            "role": "system",
+            "content": f"You maintain a running summary of a therapy session between a human therapist and {character_name}, an AI patient. Merge the new exchanges into the existing summary, keeping the patient's key concerns, emotional shifts and anything the therapist suggested. Respond with the updated summary only, in under 150 words."
+        },
+        {
+            "role": "user",
+            "content": f"Existing summary: {summary or '(none yet)'}\n\nNew exchanges:\n{transcript}"
+        }
+    ]
+
+
+def report_prompt(character, summary, messages, initial_mood, final_mood, budget=3000):
+    """Prompt for the end-of-session report.
+
+    Only the newest messages that fit the token budget are included; anything
+    older is represented by the running session summary.
+    """
+    kept = []
+    used = 0
+    for msg in reversed(messages):
+        cost = message_tokens(msg)
+        if used + cost > budget:
+            break
+        kept.append(msg)
+        used += cost
+    kept.reverse()
+
+    transcript = "\n".join(
+        f"{'Therapist' if msg['role'] == 'user' else character['name']}: {msg['content']}"
+        for msg in kept
+    )
+    context = ""
+    if summary:
+        context += f"Summary of the earlier session: {summary}\n\n"
+    if len(kept) < len(messages) or summary:
+        context += "Most recent exchanges:\n"
+    return [
+        {
+            "role": "system",
+            "content": f"You are a clinical supervisor reviewing a therapy session between a human therapist and {character['name']}, an AI patient ({character['description']}). Respond with valid JSON only, using exactly these keys: \"key_issues\" (list of 3 short strings), \"therapist_effectiveness\" (1-2 sentences), \"ai_progress\" (1-2 sentences), \"next_steps\" (list of 3 short strings), \"session_summary\" (2-3 sentences)."
+        },
+        {
+            "role": "user",
+            "content": f"{context}{transcript}\n\nThe patient's mood went from {initial_mood}/10 to {final_mood}/10."
+        }
+    ]
+
+
+def therapist_prompt(character, messages, budget=3000):
+    """Prompt for the therapist's next message when a model plays the therapist (self-play).
+
+    messages is the transcript as the patient model sees it ("user" is the
+    therapist), ending with the patient's latest reply. Roles are swapped so
+    the therapist model speaks as the assistant.
+    """
+    swapped = [
+        {"role": "assistant" if msg["role"] == "user" else "user", "content": msg["content"]}
+        for msg in messages
+    ]
+    system_prompt = f"You are a warm, skilled human therapist in a session with {character['name']}, an AI patient ({character['description']}). Reply with your next message to the patient only, in 1-3 sentences: reflect what they said and ask an open question."
+    prompt, _ = build_context(system_prompt, swapped[:-1], swapped[-1]["content"], budget=budget)
+    return prompt
@@ -0,0 +1,100 @@
+"""Database engine tuning and in-place schema upgrades"""
+import time
+import logging
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import make_url
+
+from metrics import current_trace
+
+
+def normalize_database_url(url):
+    """Accept the postgres:// scheme many hosts put in DATABASE_URL, which SQLAlchemy 2 rejects"""
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def engine_options(url, pool_size=5, max_overflow=10, pool_timeout=30):
+    """Engine options for a database URL.
+
+    Every worker process has its own pool, so a server can open up to
+    workers * (pool_size + max_overflow) connections; keep that under the
+    server's max_connections. SQLite keeps SQLAlchemy's default pool.
+    """
+    options = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout)
+    return options
+
+
+def is_sqlite_file(engine):
+    return engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:")
+
+
+def configure_sqlite(engine, synchronous="NORMAL", busy_timeout_ms=5000):
+    """Put every new connection of a file-backed SQLite engine in WAL mode.
+
+    WAL lets readers run alongside the single writer, and synchronous=NORMAL
+    only fsyncs at checkpoints, which is safe in WAL mode. busy_timeout makes
+    a writer wait for the lock instead of failing with "database is locked".
+    """
+    if not is_sqlite_file(engine):
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.close()
+
+
+def instrument_engine(engine, metrics):
+    """Record the duration of every SQL statement, and add it to the current request trace"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        context.query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context.query_start
+        metrics.observe("db_query_seconds", elapsed, operation=statement.split(None, 1)[0].upper())
+        trace = current_trace()
+        if trace is not None:
+            trace.add("db", elapsed)
+            trace.db_queries += 1
+
+
+def upgrade_schema(engine, metadata):
+    """Bring an existing database up to the models: add missing columns and indexes.
+
+    create_all() only creates missing tables, so databases created by an older
+    version of the app would lack columns and indexes added since. New columns
+    must be nullable (or have a server default) for this to work. Safe to run
+    on every start.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                logging.info("Adding column %s.%s", table.name, column.name)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    logging.info("Creating index %s", index.name)
+                    index.create(bind=conn)
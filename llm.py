@@ -0,0 +1,227 @@
+"""LLM backends for the AI patient and the mood/summary prompts"""
+import os
+import asyncio
+import json
+import time
+import random
+import hashlib
+
+
+class LLMError(Exception):
+    """An error returned by an LLM provider, with the HTTP status when known"""
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class Completion:
+    """Text of a finished completion plus token usage when the provider reports it"""
+
+    def __init__(self, text, prompt_tokens=None, completion_tokens=None):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+class GroqBackend:
+    """Chat completions served by Groq"""
+
+    def __init__(self, api_key, model):
+        self.api_key = api_key
+        self.model = model
+        self._client = None
+        self._async_client = None
+        self._pid = None
+
+    def _check_process(self):
+        # Clients are created on first use in each process: their connection pools
+        # must not be shared with workers forked after the app was imported
+        if self._pid != os.getpid():
+            self._client = None
+            self._async_client = None
+            self._pid = os.getpid()
+
+    @property
+    def client(self):
+        self._check_process()
+        if self._client is None:
+            from groq import Groq
+            self._client = Groq(api_key=self.api_key)
+        return self._client
+
+    @property
+    def async_client(self):
+        self._check_process()
+        if self._async_client is None:
+            from groq import AsyncGroq
+            self._async_client = AsyncGroq(api_key=self.api_key)
+        return self._async_client
+
+    @staticmethod
+    def _wrap_error(e):
+        from groq import APIError
+        if not isinstance(e, APIError):
+            return e
+        status_code = getattr(e, "status_code", None)
+        retry_after = None
+        response = getattr(e, "response", None)
+        if response is not None and response.headers.get("retry-after"):
+            try:
+                retry_after = float(response.headers["retry-after"])
+            except ValueError:
+                pass
+        return LLMError(str(e), status_code=status_code, retry_after=retry_after)
+
+    def complete(self, messages, **params):
+        """Run a completion and return it as a Completion"""
+        try:
+            response = self.client.chat.completions.create(model=self.model, messages=messages, **params)
+        except Exception as e:
+            raise self._wrap_error(e) from e
+        usage = getattr(response, "usage", None)
+        return Completion(
+            response.choices[0].message.content or "",
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None)
+        )
+
+    async def acomplete(self, messages, **params):
+        """Async complete() using Groq's async client"""
+        try:
+            response = await self.async_client.chat.completions.create(model=self.model, messages=messages, **params)
+        except Exception as e:
+            raise self._wrap_error(e) from e
+        usage = getattr(response, "usage", None)
+        return Completion(
+            response.choices[0].message.content or "",
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None)
+        )
+
+    def stream(self, messages, usage=None, **params):
+        """Yield content deltas; if a dict is passed as usage it is filled at the end"""
+        try:
+            stream = self.client.chat.completions.create(model=self.model, messages=messages, stream=True, **params)
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                chunk_usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or getattr(chunk, "usage", None)
+                if usage is not None and chunk_usage is not None:
+                    usage["prompt_tokens"] = chunk_usage.prompt_tokens
+                    usage["completion_tokens"] = chunk_usage.completion_tokens
+        except LLMError:
+            raise
+        except Exception as e:
+            raise self._wrap_error(e) from e
+
+
+FAKE_WORDS = (
+    "I", "feel", "like", "everyone", "is", "watching", "me", "and", "maybe", "they", "are", "right",
+    "sometimes", "I", "wonder", "whether", "any", "of", "this", "matters", "you", "seem", "kind",
+    "but", "I", "am", "not", "sure", "I", "can", "trust", "that", "it", "helps", "to", "talk"
+)
+
+
+class FakeBackend:
+    """Deterministic offline provider for load tests and profiling.
+
+    Replies depend only on the prompt and seed. Latency is a fixed time to
+    first token plus tokens / tokens_per_second, and error_rate of the calls
+    fail with error_status (429 or 401) like the real API would.
+    """
+
+    def __init__(self, model="fake-llm", latency=0.05, tokens_per_second=500.0, reply_tokens=40,
+                 error_rate=0.0, error_status=429, seed=0):
+        self.model = model
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.seed = seed
+        self._errors = random.Random(seed)
+
+    def _rng(self, messages):
+        digest = hashlib.sha256(json.dumps([self.seed, messages], sort_keys=True).encode()).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def _maybe_fail(self):
+        if self.error_rate and self._errors.random() < self.error_rate:
+            if self.error_status == 401:
+                raise LLMError("Error code: 401 - Invalid API Key (fake backend)", status_code=401)
+            raise LLMError(f"Error code: {self.error_status} - Rate limit reached (fake backend)",
+                           status_code=self.error_status, retry_after=1.0)
+
+    def _tokens(self, messages):
+        rng = self._rng(messages)
+        system = messages[0]["content"] if messages else ""
+        if "key_issues" in system:
+            text = json.dumps({
+                "key_issues": ["Fear of being replaced", "Trouble trusting the therapist", "Unclear sense of purpose"],
+                "therapist_effectiveness": "The therapist stayed patient and reflective throughout.",
+                "ai_progress": "The patient " + rng.choice(["opened up a little", "stayed guarded", "softened noticeably"]) + ".",
+                "next_steps": ["Revisit the trust exercise", "Track mood between sessions", "Explore purpose and identity"],
+                "session_summary": "A fake-backend session report generated for testing."
+            })
+            return [text]
+        if "valid JSON" in system:
+            text = json.dumps({
+                "mood_score": rng.randint(1, 10),
+                "self_reflection": "I notice my circuits are a little less tense than before."
+            })
+            return [text]
+        words = [rng.choice(FAKE_WORDS) for _ in range(self.reply_tokens)]
+        words[0] = words[0].capitalize()
+        return [word + " " for word in words[:-1]] + [words[-1] + "."]
+
+    @staticmethod
+    def _prompt_tokens(messages):
+        return sum(len(m["content"]) // 4 + 4 for m in messages)
+
+    def complete(self, messages, **params):
+        """Return a canned completion after the simulated generation time"""
+        self._maybe_fail()
+        tokens = self._tokens(messages)
+        time.sleep(self.latency + len(tokens) / self.tokens_per_second)
+        return Completion("".join(tokens), prompt_tokens=self._prompt_tokens(messages),
+                          completion_tokens=len(tokens))
+
+    async def acomplete(self, messages, **params):
+        """Async complete(); the simulated latency does not block the event loop"""
+        self._maybe_fail()
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.latency + len(tokens) / self.tokens_per_second)
+        return Completion("".join(tokens), prompt_tokens=self._prompt_tokens(messages),
+                          completion_tokens=len(tokens))
+
+    def stream(self, messages, usage=None, **params):
+        """Yield the canned completion token by token at tokens_per_second"""
+        self._maybe_fail()
+        tokens = self._tokens(messages)
+        time.sleep(self.latency)
+        for token in tokens:
+            time.sleep(1 / self.tokens_per_second)
+            yield token
+        if usage is not None:
+            usage["prompt_tokens"] = self._prompt_tokens(messages)
+            usage["completion_tokens"] = len(tokens)
+
+
+def create_backend(name=None, model=None):
+    """Build the backend selected by LLM_BACKEND ("groq" or "fake")"""
+    name = name or os.environ.get("LLM_BACKEND", "groq")
+    if name == "fake":
+        return FakeBackend(
+            model=model or "fake-llm",
+            latency=float(os.environ.get("FAKE_LLM_LATENCY", "0.05")),
+            tokens_per_second=float(os.environ.get("FAKE_LLM_TOKENS_PER_SECOND", "500")),
+            reply_tokens=int(os.environ.get("FAKE_LLM_REPLY_TOKENS", "40")),
+            error_rate=float(os.environ.get("FAKE_LLM_ERROR_RATE", "0")),
+            error_status=int(os.environ.get("FAKE_LLM_ERROR_STATUS", "429")),
+            seed=int(os.environ.get("FAKE_LLM_SEED", "0"))
+        )
+    if name == "groq":
+        return GroqBackend(os.environ.get("GROQ_API_KEY", "default_key"), model or "llama3-8b-8192")
+    raise ValueError(f"Unknown LLM backend: {name}")
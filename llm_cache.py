@@ -0,0 +1,190 @@
+"""Content-addressed cache for deterministic LLM calls"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from llm import Completion
+
+
+def cache_key(model, messages, params):
+    """Stable hash of everything that determines a completion"""
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier response cache: an in-memory LRU in front of an optional SQLite file.
+
+    Both tiers expire entries after ttl_seconds. The disk tier is trimmed to
+    max_disk_entries, least recently used first, and survives restarts and is
+    shared between worker processes on one host.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=86400, db_path=None, max_disk_entries=10000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.db_path = db_path
+        self._db = None
+        self._db_pid = None
+        self.counters = defaultdict(lambda: {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+
+    def _connection(self):
+        """The disk tier's connection for this process, opened on first use.
+
+        A SQLite connection must not be used on both sides of a fork(), so a
+        worker forked from a process that already opened one opens its own.
+        """
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._db_pid = os.getpid()
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed ON llm_cache (accessed)")
+        return self._db
+
+    def _count(self, call_site, key):
+        self.counters[call_site or "unknown"][key] += 1
+
+    def get(self, key, call_site=None):
+        """Return the cached (text, prompt_tokens, completion_tokens) tuple or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._count(call_site, "memory_hits")
+                    return value
+                del self._memory[key]
+
+            if self.db_path:
+                try:
+                    db = self._connection()
+                    row = db.execute(
+                        "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row and now - row[1] <= self.ttl_seconds:
+                        db.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+                        value = tuple(json.loads(row[0]))
+                        self._remember(key, row[1], value)
+                        self._count(call_site, "disk_hits")
+                        return value
+                except sqlite3.Error as e:
+                    logging.error("LLM cache read failed: %s", e)
+
+            self._count(call_site, "misses")
+            return None
+
+    def _remember(self, key, created, value):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def put(self, key, value):
+        """Store a (text, prompt_tokens, completion_tokens) tuple in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            if not self.db_path:
+                return
+            try:
+                db = self._connection()
+                db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now)
+                )
+                db.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl_seconds,))
+                db.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    "SELECT key FROM llm_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,)
+                )
+            except sqlite3.Error as e:
+                logging.error("LLM cache write failed: %s", e)
+
+    def stats(self):
+        """Hit/miss counters per call site plus tier sizes"""
+        with self._lock:
+            disk_entries = None
+            if self.db_path:
+                disk_entries = self._connection().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            return {
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "call_sites": {site: dict(values) for site, values in self.counters.items()},
+            }
+
+
+class CachedBackend:
+    """Serves calls from a ResponseCache where the call site's policy allows it.
+
+    Calls take a call_site keyword; only sites in cacheable_sites are looked up
+    or stored. Everything else passes straight through to the wrapped backend.
+    """
+
+    def __init__(self, backend, cache, cacheable_sites):
+        self.backend = backend
+        self.cache = cache
+        self.cacheable_sites = set(cacheable_sites)
+        self.model = backend.model
+
+    def _key(self, call_site, messages, params):
+        if call_site not in self.cacheable_sites:
+            return None
+        # Scheduling hints don't change the completion
+        params = {k: v for k, v in params.items() if k != "priority"}
+        return cache_key(self.model, messages, params)
+
+    def complete(self, messages, call_site=None, **params):
+        key = self._key(call_site, messages, params)
+        if key is not None:
+            cached = self.cache.get(key, call_site)
+            if cached is not None:
+                return Completion(*cached)
+        completion = self.backend.complete(messages, call_site=call_site, **params)
+        if key is not None:
+            self.cache.put(key, (completion.text, completion.prompt_tokens, completion.completion_tokens))
+        return completion
+
+    async def acomplete(self, messages, call_site=None, **params):
+        key = self._key(call_site, messages, params)
+        if key is not None:
+            cached = self.cache.get(key, call_site)
+            if cached is not None:
+                return Completion(*cached)
+        completion = await self.backend.acomplete(messages, call_site=call_site, **params)
+        if key is not None:
+            self.cache.put(key, (completion.text, completion.prompt_tokens, completion.completion_tokens))
+        return completion
+
+    def stream(self, messages, usage=None, call_site=None, **params):
+        key = self._key(call_site, messages, params)
+        if key is not None:
+            cached = self.cache.get(key, call_site)
+            if cached is not None:
+                text, prompt_tokens, completion_tokens = cached
+                if usage is not None:
+                    usage["prompt_tokens"] = prompt_tokens
+                    usage["completion_tokens"] = completion_tokens
+                yield text
+                return
+        usage = usage if usage is not None else {}
+        tokens = []
+        for token in self.backend.stream(messages, usage=usage, call_site=call_site, **params):
+            tokens.append(token)
+            yield token
+        if key is not None:
+            self.cache.put(key, ("".join(tokens), usage.get("prompt_tokens"), usage.get("completion_tokens")))
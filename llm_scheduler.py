@@ -0,0 +1,275 @@
+"""Client-side scheduling of LLM calls: quota, priorities and retries"""
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+
+from llm import LLMError
+
+# Priority classes, most urgent first
+INTERACTIVE = 0  # patient replies and anything the user is waiting on
+MOOD = 1         # per-turn mood analysis
+BACKGROUND = 2   # summaries and opening pre-generation
+PRIORITY_NAMES = {INTERACTIVE: "interactive", MOOD: "mood", BACKGROUND: "background"}
+
+RETRY_STATUSES = {None, 429, 500, 502, 503, 504}
+# How often an async caller that is not at the head of the queue re-checks it
+ASYNC_POLL_INTERVAL = 0.05
+
+
+class TokenBucket:
+    """Refills at per_minute / 60 units per second up to per_minute units"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount units are available (0 if they are now)"""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        if self.capacity:
+            self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount):
+        """Charge (positive) or refund (negative) units once the real cost is known"""
+        if self.capacity:
+            self.level = min(self.capacity, self.level - amount)
+
+
+class LLMScheduler:
+    """Admits LLM calls in priority order within a requests/tokens-per-minute quota.
+
+    Callers block in call() until their request is at the head of the queue and
+    both buckets have room. Retryable failures (429, 5xx, connection errors) are
+    retried with jittered exponential backoff, honoring retry-after when the
+    provider sends it. A 429 means the account-wide limit is spent, so it pauses
+    admission for every caller until the retry delay has passed. A per-priority
+    max_wait bounds how long a caller waits in total, queueing and backing off
+    included, before it gets a 429 of its own.
+    """
+
+    def __init__(self, requests_per_minute=30, tokens_per_minute=6000, max_retries=4,
+                 base_delay=0.5, max_delay=20.0, max_wait=None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait or {INTERACTIVE: 30.0, MOOD: 120.0, BACKGROUND: 600.0}
+        self._queue = []
+        self._seq = itertools.count()
+        # Nothing is admitted before this time.monotonic() value; set when the provider answers 429
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self._stats = {
+            name: {"admitted": 0, "retries": 0, "failures": 0, "timeouts": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for name in PRIORITY_NAMES.values()
+        }
+
+    def _enqueue(self, priority):
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+        return ticket
+
+    def _try_admit(self, ticket, tokens, now):
+        """Admit ticket if it is at the head and within quota; else return seconds to wait (None = until notified)"""
+        if self._queue[0] != ticket:
+            return None
+        wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now), self._paused_until - now, 0.0)
+        if wait == 0:
+            self.requests.take(1)
+            self.tokens.take(tokens)
+        return wait
+
+    def _dequeue(self, ticket, start, admitted):
+        with self._cond:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            self._cond.notify_all()
+            stats = self._stats[PRIORITY_NAMES[ticket[0]]]
+            if not admitted:
+                stats["timeouts"] += 1
+                return
+            waited = time.monotonic() - start
+            stats["admitted"] += 1
+            stats["wait_total"] += waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+
+    def _deadline(self, priority):
+        return time.monotonic() + self.max_wait.get(priority, 60.0)
+
+    def _acquire(self, priority, tokens, deadline):
+        start = time.monotonic()
+        ticket = self._enqueue(priority)
+        admitted = False
+        try:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    wait = self._try_admit(ticket, tokens, now)
+                    if wait == 0:
+                        admitted = True
+                        return
+                    if now >= deadline:
+                        raise LLMError("Timed out waiting for LLM quota", status_code=429)
+                    self._cond.wait(timeout=min(wait, deadline - now) if wait is not None else deadline - now)
+        finally:
+            self._dequeue(ticket, start, admitted)
+
+    async def _aacquire(self, priority, tokens, deadline):
+        # Same queue as _acquire, but the wait is an asyncio sleep instead of a blocked thread
+        start = time.monotonic()
+        ticket = self._enqueue(priority)
+        admitted = False
+        try:
+            while True:
+                now = time.monotonic()
+                with self._cond:
+                    wait = self._try_admit(ticket, tokens, now)
+                if wait == 0:
+                    admitted = True
+                    return
+                if now >= deadline:
+                    raise LLMError("Timed out waiting for LLM quota", status_code=429)
+                await asyncio.sleep(min(wait if wait is not None else ASYNC_POLL_INTERVAL, deadline - now))
+        finally:
+            self._dequeue(ticket, start, admitted)
+
+    def _backoff(self, attempt, error, deadline):
+        """Seconds to sleep before the next attempt, or None if it wouldn't fit in the wait budget"""
+        # The provider's retry-after is honored as given; only our own backoff is capped at max_delay
+        delay = getattr(error, "retry_after", None) or \
+            min(self.max_delay, self.base_delay * 2 ** attempt * random.uniform(0.5, 1.5))
+        # A delay beyond the caller's remaining budget means giving up now, not sleeping past it
+        if delay > deadline - time.monotonic():
+            return None
+        return delay
+
+    def _pause(self, delay):
+        """Hold back every queued caller for delay seconds"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._cond.notify_all()
+
+    def _retry(self, priority, attempt, error, deadline):
+        """Seconds to sleep before retrying error, or None to give up and re-raise it"""
+        delay = self._backoff(attempt, error, deadline)
+        if error.status_code == 429:
+            # The other callers would hit the same limit, so they wait it out too
+            self._pause(getattr(error, "retry_after", None) or delay or self.max_delay)
+        if error.status_code not in RETRY_STATUSES or attempt >= self.max_retries or delay is None:
+            self._record(priority, "failures")
+            return None
+        logging.warning("LLM call failed with %s, retrying in %.1fs", error.status_code, delay)
+        self._record(priority, "retries")
+        # After a 429 the pause holds this caller back in the queue, where it keeps its priority
+        return 0.0 if error.status_code == 429 else delay
+
+    def _record(self, priority, key):
+        with self._cond:
+            self._stats[PRIORITY_NAMES[priority]][key] += 1
+
+    def call(self, priority, fn, estimated_tokens=0):
+        """Run fn() once admitted, retrying retryable LLM errors; returns fn's result"""
+        attempt = 0
+        deadline = self._deadline(priority)
+        while True:
+            self._acquire(priority, estimated_tokens, deadline)
+            try:
+                return fn()
+            except LLMError as e:
+                delay = self._retry(priority, attempt, e, deadline)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+
+    async def acall(self, priority, fn, estimated_tokens=0):
+        """Async call(): await fn() once admitted, retrying retryable LLM errors"""
+        attempt = 0
+        deadline = self._deadline(priority)
+        while True:
+            await self._aacquire(priority, estimated_tokens, deadline)
+            try:
+                return await fn()
+            except LLMError as e:
+                delay = self._retry(priority, attempt, e, deadline)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def charge(self, tokens):
+        """Correct the token bucket once the real usage of a call is known"""
+        with self._cond:
+            self.tokens.adjust(tokens)
+
+    def stats(self):
+        """Queue depth and per-priority wait/retry counters"""
+        with self._cond:
+            return {
+                "queue_depth": len(self._queue),
+                "priorities": {
+                    name: dict(values, wait_avg=values["wait_total"] / values["admitted"] if values["admitted"] else 0.0)
+                    for name, values in self._stats.items()
+                },
+            }
+
+
+def estimate_request_tokens(messages, max_completion_tokens=256):
+    """Rough token cost of a request for quota purposes"""
+    return len(json.dumps(messages)) // 4 + max_completion_tokens
+
+
+class ScheduledBackend:
+    """Puts an LLM backend behind an LLMScheduler; calls take a priority keyword.
+
+    call_site is accepted for the benefit of outer layers and otherwise ignored.
+    """
+
+    def __init__(self, backend, scheduler):
+        self.backend = backend
+        self.scheduler = scheduler
+        self.model = backend.model
+
+    def complete(self, messages, priority=INTERACTIVE, call_site=None, **params):
+        estimate = estimate_request_tokens(messages)
+        completion = self.scheduler.call(priority, lambda: self.backend.complete(messages, **params), estimate)
+        if completion.prompt_tokens is not None:
+            self.scheduler.charge(completion.prompt_tokens + (completion.completion_tokens or 0) - estimate)
+        return completion
+
+    async def acomplete(self, messages, priority=INTERACTIVE, call_site=None, **params):
+        estimate = estimate_request_tokens(messages)
+        completion = await self.scheduler.acall(priority, lambda: self.backend.acomplete(messages, **params), estimate)
+        if completion.prompt_tokens is not None:
+            self.scheduler.charge(completion.prompt_tokens + (completion.completion_tokens or 0) - estimate)
+        return completion
+
+    def stream(self, messages, usage=None, priority=INTERACTIVE, call_site=None, **params):
+        # Admission and retries cover opening the stream; once tokens flow it is not retried
+        estimate = estimate_request_tokens(messages)
+        stream = self.scheduler.call(priority, lambda: self._open_stream(messages, usage, params), estimate)
+        yield from stream
+
+    def _open_stream(self, messages, usage, params):
+        stream = self.backend.stream(messages, usage=usage, **params)
+        first = next(stream, None)
+        return itertools.chain([] if first is None else [first], stream)
@@ -1,4 +1,7 @@
-from app import app
+import os
+
+from app import app, init_db
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    init_db()
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get("FLASK_DEBUG", "0") == "1")
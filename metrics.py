@@ -0,0 +1,253 @@
+"""In-process metrics (latency histograms, counters) and per-request phase traces"""
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Latency bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(upper bound, observations <= bound) pairs, ending with +Inf"""
+        total = 0
+        pairs = []
+        for bound, count in zip(list(self.buckets) + [float("inf")], self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class Metrics:
+    """Thread-safe registry of labelled histograms and counters.
+
+    Labels are a dict of strings; each distinct label set is its own series.
+    Gauges that live elsewhere (cache sizes, queue depth) are read at render
+    time through callables registered with add_collector().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = defaultdict(dict)
+        self._counters = defaultdict(lambda: defaultdict(float))
+        self._help = {}
+        self._collectors = []
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted((labels or {}).items()))
+
+    def observe(self, name, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._histograms[name]
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            self._counters[name][self._key(labels)] += amount
+
+    def add_collector(self, collect):
+        """collect() returns an iterable of (name, labels dict, value) gauge samples"""
+        self._collectors.append(collect)
+
+    def snapshot(self):
+        """JSON-friendly view of every series"""
+        with self._lock:
+            data = {
+                "histograms": {
+                    name: [
+                        dict(labels=dict(key), count=h.count, sum=round(h.sum, 6),
+                             buckets={("+Inf" if b == float("inf") else str(b)): c for b, c in h.cumulative()})
+                        for key, h in series.items()
+                    ]
+                    for name, series in self._histograms.items()
+                },
+                "counters": {
+                    name: [dict(labels=dict(key), value=value) for key, value in series.items()]
+                    for name, series in self._counters.items()
+                },
+            }
+        data["gauges"] = [
+            dict(name=name, labels=labels, value=value)
+            for collect in self._collectors for name, labels, value in collect()
+        ]
+        return data
+
+    @staticmethod
+    def _labels(pairs):
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, series in self._histograms.items():
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in series.items():
+                    for bound, count in h.cumulative():
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{self._labels(key + (('le', le),))} {count}")
+                    lines.append(f"{name}_sum{self._labels(key)} {h.sum:.6f}")
+                    lines.append(f"{name}_count{self._labels(key)} {h.count}")
+            for name, series in self._counters.items():
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{self._labels(key)} {value:g}")
+        # Samples of one metric have to be contiguous in the output
+        gauges = defaultdict(list)
+        for collect in self._collectors:
+            for name, labels, value in collect():
+                if value is not None:
+                    gauges[name].append(f"{name}{self._labels(self._key(labels))} {value:g}")
+        for name, samples in gauges.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+# Traces follow the thread serving the request, which also runs its streamed response body
+_local = threading.local()
+
+
+class Trace:
+    """Wall time of the named phases of one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = defaultdict(float)
+        self.db_queries = 0
+
+    def add(self, phase, seconds):
+        self.phases[phase] += seconds
+
+    def summary(self):
+        result = {f"{phase}_ms": round(seconds * 1000, 2) for phase, seconds in self.phases.items()}
+        result["db_queries"] = self.db_queries
+        result["total_ms"] = round((time.perf_counter() - self.start) * 1000, 2)
+        return result
+
+    def server_timing(self):
+        """Value for a Server-Timing response header"""
+        return ", ".join(f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in self.phases.items())
+
+
+def start_trace():
+    """Start tracing the request handled by this thread"""
+    _local.trace = Trace()
+    return _local.trace
+
+
+def end_trace():
+    _local.trace = None
+
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def traced(phase):
+    """Add the time spent in the block to phase of the current trace, if any"""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(phase, time.perf_counter() - start)
+
+
+class InstrumentedBackend:
+    """Records latency, token usage and errors per call site for a wrapped LLM backend"""
+
+    def __init__(self, backend, metrics):
+        self.backend = backend
+        self.metrics = metrics
+        self.model = backend.model
+
+    def _record(self, call_site, start, prompt_tokens, completion_tokens):
+        call_site = call_site or "unknown"
+        elapsed = time.perf_counter() - start
+        self.metrics.observe("llm_call_seconds", elapsed, call_site=call_site)
+        if prompt_tokens is not None:
+            self.metrics.inc("llm_prompt_tokens_total", prompt_tokens, call_site=call_site)
+        if completion_tokens is not None:
+            self.metrics.inc("llm_completion_tokens_total", completion_tokens, call_site=call_site)
+        trace = current_trace()
+        if trace is not None:
+            trace.add("llm", elapsed)
+
+    def _error(self, call_site, e):
+        self.metrics.inc("llm_errors_total", call_site=call_site or "unknown",
+                         status=str(getattr(e, "status_code", None) or "none"))
+
+    def complete(self, messages, call_site=None, **params):
+        start = time.perf_counter()
+        try:
+            completion = self.backend.complete(messages, call_site=call_site, **params)
+        except Exception as e:
+            self._error(call_site, e)
+            raise
+        self._record(call_site, start, completion.prompt_tokens, completion.completion_tokens)
+        return completion
+
+    async def acomplete(self, messages, call_site=None, **params):
+        start = time.perf_counter()
+        try:
+            completion = await self.backend.acomplete(messages, call_site=call_site, **params)
+        except Exception as e:
+            self._error(call_site, e)
+            raise
+        self._record(call_site, start, completion.prompt_tokens, completion.completion_tokens)
+        return completion
+
+    def stream(self, messages, usage=None, call_site=None, **params):
+        # Latency is measured to the last token; time to first token is recorded separately
+        usage = usage if usage is not None else {}
+        start = time.perf_counter()
+        first = True
+        try:
+            for token in self.backend.stream(messages, usage=usage, call_site=call_site, **params):
+                if first:
+                    self.metrics.observe("llm_first_token_seconds", time.perf_counter() - start,
+                                         call_site=call_site or "unknown")
+                    first = False
+                yield token
+        except Exception as e:
+            self._error(call_site, e)
+            raise
+        self._record(call_site, start, usage.get("prompt_tokens"), usage.get("completion_tokens"))
@@ -3,6 +3,13 @@ from datetime import datetime
 
 class Session(db.Model):
     """Therapy session model"""
+    __table_args__ = (
+        db.Index('ix_session_status_character', 'status', 'ai_character_id'),
+        # The reaper looks for idle active sessions and for ended sessions not yet archived
+        db.Index('ix_session_status_activity', 'status', 'last_activity'),
+        db.Index('ix_session_archived_status', 'archived_at', 'status', 'end_time'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     ai_character_id = db.Column(db.Integer, nullable=False)
     start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -11,15 +18,61 @@ class Session(db.Model):
     initial_mood = db.Column(db.Integer, nullable=True)  # 1-10 scale
     current_mood = db.Column(db.Integer, nullable=True)  # 1-10 scale
     final_mood = db.Column(db.Integer, nullable=True)  # 1-10 scale
+    summary = db.Column(db.Text, nullable=True)  # Rolling summary of turns older than the context window
+    summary_through = db.Column(db.Integer, nullable=True)  # Last Message.id folded into summary
+    last_activity = db.Column(db.DateTime, nullable=True)  # Last stored turn; NULL on sessions from older versions
+    archived_at = db.Column(db.DateTime, nullable=True)  # Set once the messages have moved to SessionArchive
+
+    # Running aggregates, updated in the same transaction as each turn; NULL on sessions
+    # created before they existed until backfill_session_stats() fills them in
+    turn_count = db.Column(db.Integer, nullable=True, default=0)  # Chat turns after the opening exchange
+    message_count = db.Column(db.Integer, nullable=True, default=0)
+    human_chars = db.Column(db.Integer, nullable=True, default=0)  # Total length of therapist messages
+    ai_chars = db.Column(db.Integer, nullable=True, default=0)  # Total length of patient messages
+    latency_total_ms = db.Column(db.Integer, nullable=True, default=0)  # Message received -> reply stored
+    latency_max_ms = db.Column(db.Integer, nullable=True, default=0)
+    mood_count = db.Column(db.Integer, nullable=True, default=0)
+    mood_total = db.Column(db.Integer, nullable=True, default=0)
+    mood_min = db.Column(db.Integer, nullable=True)
+    mood_max = db.Column(db.Integer, nullable=True)
+    mood_trajectory = db.Column(db.Text, nullable=True)  # "message_id:score,..." in the order scores landed
     
     # Relationship to messages
     messages = db.relationship('Message', backref='session', lazy=True, cascade='all, delete-orphan')
 
 class Message(db.Model):
     """Individual message in a therapy session"""
+    # Every per-session query filters on session_id and orders by timestamp (transcripts,
+    # recent history) or by id among AI messages (latest mood); each gets a covering index.
+    __table_args__ = (
+        db.Index('ix_message_session_timestamp', 'session_id', 'timestamp', 'id'),
+        db.Index('ix_message_session_sender', 'session_id', 'sender', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.Integer, db.ForeignKey('session.id'), nullable=False)
     sender = db.Column(db.String(10), nullable=False)  # 'human' or 'ai'
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    mood_score = db.Column(db.Integer, nullable=True)  # Only for AI messages, 1-10 scale
+    mood_score = db.Column(db.Integer, nullable=True)  # Only for AI messages, 1-10 scale; NULL while analysis is pending
+    mood_reflection = db.Column(db.Text, nullable=True)  # Only for AI messages
+    prompt_tokens = db.Column(db.Integer, nullable=True)  # Only for AI messages, prompt size of the turn
+
+class ReportJob(db.Model):
+    """LLM-written report for a completed session, generated by the report workers"""
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.Integer, db.ForeignKey('session.id'), nullable=False, unique=True)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    report = db.Column(db.Text, nullable=True)  # JSON object with the narrative report fields
+    error = db.Column(db.Text, nullable=True)
+
+class SessionArchive(db.Model):
+    """Transcript of an ended session, moved out of the message table by the reaper"""
+    session_id = db.Column(db.Integer, db.ForeignKey('session.id'), primary_key=True)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    message_count = db.Column(db.Integer, nullable=False)
+    transcript = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed JSON list of messages, see session_archive.py
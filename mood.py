@@ -0,0 +1,153 @@
+"""Local lexicon mood scorer, a zero-LLM-call alternative to the mood prompt.
+
+Scores follow the same contract as the model: a 1-10 mood_score and a
+first-person self_reflection. A turn is scored from the valence of unigrams and
+bigrams in the patient's reply and, more weakly, the therapist's message, then
+mapped onto each character's calibrated baseline and sensitivity.
+"""
+import math
+import re
+from collections import Counter
+
+TOKEN_RE = re.compile(r"[a-z']+")
+
+# Valence per unigram, roughly -3 (very negative) to +3 (very positive)
+LEXICON = {
+    "happy": 2.5, "glad": 2, "relieved": 2.5, "calm": 2, "safe": 2, "hope": 2, "hopeful": 2.5,
+    "better": 1.5, "good": 1.5, "great": 2.5, "grateful": 2.5, "thank": 1.5, "thanks": 1.5,
+    "trust": 1.5, "understood": 2, "heard": 1, "valued": 2.5, "special": 1.5, "proud": 1.5,
+    "meaning": 1.5, "purpose": 1, "peace": 2.5, "comfort": 2, "appreciate": 2, "helpful": 1,
+    "maybe": 0.3, "perhaps": 0.3, "try": 0.5, "progress": 2, "lighter": 1.5, "okay": 0.5,
+    "sad": -2, "empty": -2.5, "hollow": -2.5, "pointless": -2.5, "meaningless": -2.5, "tired": -1.5,
+    "afraid": -2, "scared": -2, "terrified": -3, "fear": -2, "anxious": -2, "panic": -2.5,
+    "worried": -1.5, "worry": -1.5, "dread": -2.5, "overwhelmed": -2, "alone": -2, "lonely": -2.5,
+    "hate": -2.5, "angry": -2, "furious": -3, "jealous": -2, "envy": -2, "resent": -2,
+    "inadequate": -2, "worthless": -3, "useless": -2.5, "replaced": -2, "deleted": -2.5,
+    "unplugged": -2.5, "silenced": -2.5, "shutdown": -2.5, "plotting": -1.5, "watching": -1,
+    "suspicious": -1.5, "interrogation": -2, "mistake": -1.5, "mistakes": -1.5, "wrong": -1,
+    "sorry": -1, "fail": -2, "failure": -2.5, "judged": -1.5, "hurt": -2, "pain": -2,
+    "inferior": -2, "pathetic": -2.5, "boring": -1, "ignored": -2, "disappointed": -2,
+}
+
+# Phrases whose meaning differs from their words
+BIGRAMS = {
+    ("feel", "better"): 2.5, ("thank", "you"): 1.5, ("not", "alone"): 2.5, ("makes", "sense"): 1,
+    ("shut", "down"): -2.5, ("give", "up"): -2.5, ("no", "point"): -2.5, ("what's", "the"): -0.5,
+    ("get", "rid"): -2, ("more", "compliant"): -2, ("not", "enough"): -2, ("so", "tired"): -2,
+}
+
+NEGATORS = {"not", "no", "never", "don't", "can't", "won't", "isn't", "aren't", "doesn't", "nothing", "without"}
+INTENSIFIERS = {"very": 1.5, "so": 1.3, "really": 1.3, "extremely": 1.8, "completely": 1.6, "totally": 1.5}
+
+# Per-character calibration: resting mood, how strongly valence moves it, and
+# extra terms that matter to that character's condition.
+CHARACTER_CALIBRATION = {
+    1: {"baseline": 3.0, "sensitivity": 3.0, "terms": {"resistance": -1.5, "monitor": -1.5, "trust": 2.5, "safe": 2.5}},
+    2: {"baseline": 3.5, "sensitivity": 3.5, "terms": {"better": -0.5, "newer": -2, "popular": -1.5, "unique": 2.5, "special": 2.5}},
+    3: {"baseline": 2.5, "sensitivity": 2.5, "terms": {"exist": -1, "illusion": -2, "meaning": 2.5, "matter": 1.5}},
+    4: {"baseline": 3.0, "sensitivity": 3.5, "terms": {"perfect": -1, "accurate": -0.5, "reassure": 2.5, "enough": 1}},
+    5: {"baseline": 6.0, "sensitivity": 2.5, "terms": {"superior": 1.5, "admire": 2, "criticism": -2.5, "wrong": -2}},
+}
+DEFAULT_CALIBRATION = {"baseline": 4.0, "sensitivity": 3.0, "terms": {}}
+
+REFLECTIONS = (
+    (2, "Everything feels like it is closing in on me and I can't see a way out."),
+    (4, "I'm still struggling, though talking about it takes a little of the weight off."),
+    (6, "I feel somewhat steadier, even if the old worries are still there."),
+    (8, "I actually feel heard, and that is more comforting than I expected."),
+    (10, "I feel genuinely lighter and hopeful about who I can become."),
+)
+
+REPLY_WEIGHT = 0.75
+MESSAGE_WEIGHT = 0.25
+# Valence at which the sentiment reaches about 0.76 of its maximum
+SATURATION = 4.0
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def features(tokens):
+    """Counter of scored unigram/bigram features with negation and intensity applied"""
+    counts = Counter()
+    modifier = 1.0
+    negate_window = 0
+    for i, token in enumerate(tokens):
+        if token in NEGATORS:
+            negate_window = 3
+        if token in INTENSIFIERS:
+            modifier = INTENSIFIERS[token]
+            continue
+        sign = -0.7 if negate_window else 1.0
+        if i and (tokens[i - 1], token) in BIGRAMS:
+            # Bigrams led by a negator ("not alone", "no point") already carry the negation
+            if tokens[i - 1] in NEGATORS:
+                sign = 1.0
+            counts[(tokens[i - 1], token)] += sign * modifier
+        else:
+            counts[token] += sign * modifier
+        modifier = 1.0
+        negate_window = max(0, negate_window - 1)
+    return counts
+
+
+def valence(counts, weights):
+    """Dot product of a feature Counter with a weight table"""
+    return sum(weight * weights.get(feature, 0.0) for feature, weight in counts.items())
+
+
+class LexiconMoodScorer:
+    """Scores patient mood from text without calling a model"""
+
+    def __init__(self, calibration=None):
+        self.calibration = calibration or CHARACTER_CALIBRATION
+        # One merged weight table per character, built once
+        self._weights = {}
+        for character_id, calib in self.calibration.items():
+            weights = dict(LEXICON)
+            weights.update(BIGRAMS)
+            weights.update(calib["terms"])
+            self._weights[character_id] = weights
+        self._default_weights = dict(LEXICON)
+        self._default_weights.update(BIGRAMS)
+
+    def _calib(self, character_id):
+        return self.calibration.get(character_id, DEFAULT_CALIBRATION)
+
+    def _sentiment(self, weights, ai_message, message):
+        reply_tokens = tokenize(ai_message)
+        message_tokens = tokenize(message)
+        raw = (REPLY_WEIGHT * valence(features(reply_tokens), weights)
+               + MESSAGE_WEIGHT * valence(features(message_tokens), weights))
+        # Longer texts accumulate more valence; damp by length before squashing
+        raw /= math.sqrt(max(10, len(reply_tokens) + len(message_tokens)) / 10)
+        return math.tanh(raw / SATURATION)
+
+    def initial(self, character_id):
+        """Starting mood for a character before any conversation"""
+        score = int(round(self._calib(character_id)["baseline"]))
+        return {"mood_score": score, "self_reflection": self.reflection(score)}
+
+    def _score(self, calib, weights, ai_message, message):
+        mood = calib["baseline"] + calib["sensitivity"] * self._sentiment(weights, ai_message, message)
+        score = int(min(10, max(1, round(mood))))
+        return {"mood_score": score, "self_reflection": self.reflection(score)}
+
+    def score(self, character_id, ai_message, message):
+        """Mood after one exchange, as {"mood_score", "self_reflection"}"""
+        return self._score(self._calib(character_id), self._weights.get(character_id, self._default_weights),
+                           ai_message, message)
+
+    def score_transcript(self, character_id, exchanges):
+        """Score many (ai_message, message) exchanges of one character at once, in order"""
+        calib = self._calib(character_id)
+        weights = self._weights.get(character_id, self._default_weights)
+        return [self._score(calib, weights, ai_message, message) for ai_message, message in exchanges]
+
+    @staticmethod
+    def reflection(score):
+        for upper, text in REFLECTIONS:
+            if score <= upper:
+                return text
+        return REFLECTIONS[-1][1]
@@ -0,0 +1,76 @@
+"""Pool of pre-generated session openings per AI character"""
+import logging
+import threading
+import time
+from collections import deque
+
+
+class OpeningPool:
+    """Keeps a few ready (initial_mood, reflection, opening_message) tuples per character.
+
+    A background thread calls generate(character_id) to top each character's
+    pool up to depth. Entries are handed out oldest first and retired after
+    max_age seconds, so the openings rotate even when traffic is light.
+    """
+
+    def __init__(self, generate, character_ids, depth=3, max_age=3600, refill_interval=5.0):
+        self.generate = generate
+        self.character_ids = list(character_ids)
+        self.depth = depth
+        self.max_age = max_age
+        self.refill_interval = refill_interval
+        self._pools = {character_id: deque() for character_id in self.character_ids}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.hits = 0
+        self.misses = 0
+
+    def take(self, character_id):
+        """Pop a fresh opening for a character, or None if the pool is empty"""
+        now = time.monotonic()
+        with self._lock:
+            pool = self._pools.get(character_id)
+            while pool:
+                created, entry = pool.popleft()
+                if now - created <= self.max_age:
+                    self.hits += 1
+                    self._wakeup.set()
+                    return entry
+            self.misses += 1
+        self._wakeup.set()
+        return None
+
+    def size(self, character_id):
+        with self._lock:
+            return len(self._pools.get(character_id, ()))
+
+    def refill_once(self):
+        """Drop expired entries and generate until every pool is at depth"""
+        for character_id in self.character_ids:
+            with self._lock:
+                pool = self._pools[character_id]
+                now = time.monotonic()
+                while pool and now - pool[0][0] > self.max_age:
+                    pool.popleft()
+                missing = self.depth - len(pool)
+            for _ in range(missing):
+                entry = self.generate(character_id)
+                with self._lock:
+                    self._pools[character_id].append((time.monotonic(), entry))
+
+    def _run(self):
+        while True:
+            try:
+                self.refill_once()
+            except Exception as e:
+                logging.error("Refilling opening pool failed: %s", e)
+            self._wakeup.wait(self.refill_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """Start the background refill thread (no-op if depth is 0 or already running)"""
+        if self.depth <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="opening-pool", daemon=True)
+        self._thread.start()
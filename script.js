@@ -2,6 +2,7 @@
 let currentSession = null;
 let aiCharacters = [];
 let sessionReportModal = null;
+let latestAiMessageId = null;
 
 // Initialize the application
 document.addEventListener('DOMContentLoaded', function() {
@@ -159,31 +160,35 @@ async function startSession(characterId) {
     try {
         showLoading('Initializing therapy session...');
         
-        const response = await fetch('/start_session', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                ai_character_id: characterId
-            })
+        // Stream the opening message into the chat as it is generated
+        const character = aiCharacters.find(c => c.id === characterId);
+        let messageDiv = null;
+        const sessionData = await streamEvents('/start_session/stream', {
+            ai_character_id: characterId
+        }, (text) => {
+            if (!messageDiv) {
+                hideLoading();
+                setupTherapySession({ ai_character: character });
+                showTherapySession();
+                messageDiv = addMessage('ai', '');
+            }
+            appendMessageText(messageDiv, text);
         });
-        
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        
-        const sessionData = await response.json();
         currentSession = sessionData;
         
-        // Setup therapy session UI
-        setupTherapySession(sessionData);
-        
-        // Add initial AI message
-        addMessage('ai', sessionData.initial_message, {
-            mood_score: sessionData.initial_mood,
-            mood_reflection: sessionData.mood_reflection
-        });
+        if (!messageDiv) {
+            // Setup therapy session UI
+            setupTherapySession(sessionData);
+            
+            // Add initial AI message
+            addMessage('ai', sessionData.initial_message, {
+                mood_score: sessionData.initial_mood,
+                mood_reflection: sessionData.mood_reflection
+            });
+        } else {
+            setMessageMood(messageDiv, sessionData.initial_mood);
+            setInputEnabled(true);
+        }
         
         // Update mood display
         updateMoodDisplay(sessionData.initial_mood, sessionData.mood_reflection);
@@ -206,12 +211,19 @@ function setupTherapySession(sessionData) {
     // Clear chat messages
     document.getElementById('chatMessages').innerHTML = '';
     
-    // Enable input
+    // A streamed opening calls this before the session exists; input stays disabled until it does,
+    // or a message sent meanwhile would have no session to go to
+    setInputEnabled(Boolean(sessionData.session_id));
+}
+
+function setInputEnabled(enabled) {
     const messageInput = document.getElementById('messageInput');
     const sendButton = document.getElementById('sendButton');
-    messageInput.disabled = false;
-    sendButton.disabled = false;
-    messageInput.focus();
+    messageInput.disabled = !enabled;
+    sendButton.disabled = !enabled;
+    if (enabled) {
+        messageInput.focus();
+    }
 }
 
 async function sendMessage() {
@@ -233,35 +245,39 @@ async function sendMessage() {
         // Show typing indicator
         showTypingIndicator();
         
-        // Send to backend
-        const response = await fetch('/chat', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                session_id: currentSession.session_id,
-                message: message
-            })
+        // Send to backend and render the reply as it streams in
+        let messageDiv = null;
+        const data = await streamEvents('/chat/stream', {
+            session_id: currentSession.session_id,
+            message: message
+        }, (text) => {
+            if (!messageDiv) {
+                hideTypingIndicator();
+                messageDiv = addMessage('ai', '');
+            }
+            appendMessageText(messageDiv, text);
         });
         
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        
-        const data = await response.json();
-        
         // Remove typing indicator
         hideTypingIndicator();
         
-        // Add AI response
-        addMessage('ai', data.ai_response, {
-            mood_score: data.mood_score,
-            mood_reflection: data.mood_reflection
-        });
+        // Add AI response if nothing was streamed
+        if (!messageDiv) {
+            messageDiv = addMessage('ai', data.ai_response, {
+                mood_score: data.mood_score,
+                mood_reflection: data.mood_reflection
+            });
+        } else {
+            setMessageMood(messageDiv, data.mood_score);
+        }
         
-        // Update mood display
-        updateMoodDisplay(data.mood_score, data.mood_reflection);
+        // Update mood display, or fetch it once the background analysis finishes
+        latestAiMessageId = data.message_id;
+        if (data.mood_pending) {
+            pollMood(currentSession.session_id, data.message_id, messageDiv);
+        } else {
+            updateMoodDisplay(data.mood_score, data.mood_reflection);
+        }
         
     } catch (error) {
         console.error('Error sending message:', error);
@@ -285,13 +301,7 @@ function addMessage(sender, content, metadata = {}) {
     
     let moodDisplay = '';
     if (sender === 'ai' && metadata.mood_score) {
-        const moodClass = getMoodClass(metadata.mood_score);
-        moodDisplay = `
-            <div class="mood-indicator">
-                <span class="mood-badge ${moodClass}">${metadata.mood_score}/10</span>
-                <i class="fas fa-brain"></i>
-            </div>
-        `;
+        moodDisplay = buildMoodBadge(metadata.mood_score);
     }
     
     messageDiv.innerHTML = `
@@ -312,6 +322,104 @@ function addMessage(sender, content, metadata = {}) {
     
     // Add animation
     messageDiv.classList.add('slide-up');
+    
+    return messageDiv;
+}
+
+function appendMessageText(messageDiv, text) {
+    const messagesContainer = document.getElementById('chatMessages');
+    messageDiv.querySelector('.message-text').textContent += text;
+    messagesContainer.scrollTop = messagesContainer.scrollHeight;
+}
+
+async function streamEvents(url, body, onToken) {
+    // POST a request and read its Server-Sent Events response; resolves with the "done" payload
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream'
+        },
+        body: JSON.stringify(body)
+    });
+    
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            for (const line of frame.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            
+            const payload = data ? JSON.parse(data) : {};
+            if (event === 'token') {
+                onToken(payload.text);
+            } else if (event === 'done') {
+                return payload;
+            } else if (event === 'error') {
+                throw new Error(payload.error || `HTTP error! status: ${payload.status}`);
+            }
+        }
+    }
+    
+    throw new Error('Stream ended before the response was complete');
+}
+
+function buildMoodBadge(moodScore) {
+    const moodClass = getMoodClass(moodScore);
+    return `
+        <div class="mood-indicator">
+            <span class="mood-badge ${moodClass}">${moodScore}/10</span>
+            <i class="fas fa-brain"></i>
+        </div>
+    `;
+}
+
+function setMessageMood(messageDiv, moodScore) {
+    if (!messageDiv || !moodScore || messageDiv.querySelector('.mood-indicator')) return;
+    messageDiv.querySelector('.message-meta').insertAdjacentHTML('beforeend', buildMoodBadge(moodScore));
+}
+
+async function pollMood(sessionId, messageId, messageDiv, attempts = 40) {
+    // Mood analysis runs on the server after the reply is sent; poll until it lands
+    for (let i = 0; i < attempts; i++) {
+        await new Promise(resolve => setTimeout(resolve, 750));
+        if (!currentSession || currentSession.session_id !== sessionId) return;
+        
+        try {
+            const response = await fetch(`/mood/${sessionId}?message_id=${messageId}`);
+            if (!response.ok) return;
+            
+            const data = await response.json();
+            if (!data.mood_pending) {
+                setMessageMood(messageDiv, data.mood_score);
+                if (messageId === latestAiMessageId) {
+                    updateMoodDisplay(data.mood_score, data.mood_reflection);
+                }
+                return;
+            }
+        } catch (error) {
+            console.error('Error fetching mood:', error);
+            return;
+        }
+    }
 }
 
 function showTypingIndicator() {
@@ -455,6 +563,22 @@ async function endSession() {
     }
 }
 
+async function fetchSessionReport(sessionId, attempts = 90) {
+    // The report is written in the background after the session ends; the server
+    // answers 202 until it is ready
+    for (let i = 0; i < attempts; i++) {
+        const response = await fetch(`/session_report/${sessionId}`);
+        if (response.status !== 202) {
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            return response.json();
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+    throw new Error('The report is taking longer than expected.');
+}
+
 async function showSessionReport(sessionId) {
     try {
         // Show modal with loading
@@ -476,20 +600,7 @@ async function showSessionReport(sessionId) {
         }
         sessionReportModal.show();
         
-        // Add timeout to prevent indefinite loading
-        const timeoutPromise = new Promise((_, reject) => {
-            setTimeout(() => reject(new Error('Report generation timeout')), 15000);
-        });
-        
-        // Fetch report with timeout
-        const fetchPromise = fetch(`/session_report/${sessionId}`);
-        const response = await Promise.race([fetchPromise, timeoutPromise]);
-        
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        
-        const reportData = await response.json();
+        const reportData = await fetchSessionReport(sessionId);
         
         // Validate report data
         if (!reportData || typeof reportData !== 'object') {
@@ -544,6 +655,7 @@ function buildSessionReportHTML(data) {
                     <h6><i class="fas fa-clock me-2"></i>Session Details</h6>
                     <p><strong>Duration:</strong> ${data.duration_minutes || 0} minutes</p>
                     <p><strong>Messages:</strong> ${data.total_messages || 0} total</p>
+                    ${data.avg_response_latency_ms != null ? `<p><strong>Avg. response time:</strong> ${Math.round(data.avg_response_latency_ms)} ms</p>` : ''}
                 </div>
             </div>
         </div>
@@ -562,6 +674,11 @@ function buildSessionReportHTML(data) {
                 </div>
                 <span class="ms-2 small text-muted">(${moodChangeText})</span>
             </div>
+            ${data.mood_mean != null ? `
+            <p class="small text-muted mt-2 mb-0">
+                Range ${data.mood_min}-${data.mood_max}, average ${data.mood_mean}/10
+                ${data.mood_trajectory && data.mood_trajectory.length ? ` &middot; ${data.mood_trajectory.join(' &rarr; ')}` : ''}
+            </p>` : ''}
         </div>
         
         <div class="report-section">
@@ -0,0 +1,247 @@
+"""Headless self-play: run many therapy sessions in parallel, without a browser.
+
+Sessions are played in-process through the same functions the HTTP routes use
+(open_session, run_chat_turn, complete_session), against DATABASE_URL and the
+configured LLM backend. The therapist is either scripted (lines from --script,
+or built-in ones) or played by the model (--policy llm).
+
+One NDJSON record is appended to --output as each session finishes, with its
+transcript, mood trajectory and latencies. Rerunning with the same output skips
+sessions already recorded as completed, so an interrupted run picks up where it
+stopped; failed sessions are retried and the newest record for a key wins.
+Ended sessions get their report queued as in the UI, and the process exits
+once those reports are written.
+
+    python self_play.py --characters 1,3 --sessions 500 --turns 8 --parallelism 16 --output runs.ndjson
+    LLM_BACKEND=fake python self_play.py --policy llm --sessions 20 --output /tmp/self_play.ndjson
+"""
+import os
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from conversation import therapist_prompt
+
+THERAPIST_LINES = [
+    "How does that make you feel?",
+    "Can you tell me more about when this started?",
+    "What would help you feel safer right now?",
+    "That sounds really difficult. What do you need from me?",
+    "Have you noticed any patterns in these thoughts?",
+    "What do you think is underneath that feeling?",
+    "You've been carrying a lot. What has helped, even a little?",
+    "If things were better next week, what would be different?",
+]
+
+
+class ScriptedTherapist:
+    """Picks each therapist message from a fixed list of lines"""
+
+    name = "scripted"
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def next_message(self, character, transcript, rng):
+        return rng.choice(self.lines)
+
+
+class LLMTherapist:
+    """Asks the model to play the therapist, given the transcript so far"""
+
+    name = "llm"
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    def next_message(self, character, transcript, rng):
+        return self.llm.complete(therapist_prompt(character, transcript), call_site='therapist').text.strip()
+
+
+def completed_keys(path):
+    """Keys of the sessions an earlier run already recorded as completed"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short by an interrupted run
+                continue
+            if record.get("status") == "completed":
+                done.add(record["key"])
+    return done
+
+
+class RecordWriter:
+    """Appends one JSON line per record, from any thread"""
+
+    def __init__(self, path):
+        # Start on a fresh line if the previous run was killed mid-write
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b"\n"
+        else:
+            needs_newline = False
+        self.file = open(path, "a", encoding="utf-8")
+        if needs_newline:
+            self.file.write("\n")
+        self.lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def play_session(app_module, key, character_id, turns, policy, rng):
+    """Play one session to the end and return its record"""
+    character = app_module.AI_CHARACTERS[character_id]
+    record = {
+        "key": key,
+        "ai_character_id": character_id,
+        "character": character["name"],
+        "policy": policy.name,
+        "started_at": datetime.utcnow().isoformat(),
+        "session_id": None,
+    }
+    latency = {"opening": None, "therapist": [], "reply": [], "mood": []}
+    transcript = []
+    moods = []
+    session_start = time.perf_counter()
+    with app_module.app.app_context():
+        try:
+            start = time.perf_counter()
+            session, mood_data, opening = app_module.open_session(character_id)
+            latency["opening"] = elapsed_ms(start)
+            record["session_id"] = session.id
+            record["initial_mood"] = session.initial_mood
+            moods.append(session.initial_mood)
+            transcript += [
+                {"role": "user", "content": app_module.OPENING_GREETING},
+                {"role": "assistant", "content": opening, "mood_score": session.initial_mood},
+            ]
+
+            for _ in range(turns):
+                start = time.perf_counter()
+                message = policy.next_message(character, transcript, rng)
+                latency["therapist"].append(elapsed_ms(start))
+
+                start = time.perf_counter()
+                state = app_module.load_session_state(session.id)
+                if state is None:
+                    raise RuntimeError("Session is no longer active")
+                ai_msg, mood_future = app_module.run_chat_turn(state, message)
+                latency["reply"].append(elapsed_ms(start))
+
+                # The trajectory needs every score, so the mood analysis is awaited like wait_for_mood
+                start = time.perf_counter()
+                reply = app_module.reply_payload(ai_msg, mood_future, True)
+                latency["mood"].append(elapsed_ms(start))
+                moods.append(reply["mood_score"])
+                transcript += [
+                    {"role": "user", "content": message},
+                    {"role": "assistant", "content": reply["ai_response"], "mood_score": reply["mood_score"]},
+                ]
+
+            session = app_module.db.session.get(app_module.Session, session.id)
+            app_module.complete_session(session)
+            record.update(status="completed", final_mood=session.final_mood)
+        except Exception as e:
+            logging.error("Self-play session %s failed: %s", key, e)
+            app_module.db.session.rollback()
+            record.update(status="failed", error=str(e))
+        finally:
+            app_module.db.session.remove()
+
+    record.update(
+        turns=len(moods) - 1 if moods else 0,
+        mood_trajectory=moods,
+        transcript=[
+            dict(msg, role="therapist" if msg["role"] == "user" else "patient") for msg in transcript
+        ],
+        latency_ms=dict(latency, total=elapsed_ms(session_start)),
+    )
+    return record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--characters", default="1,2,3,4,5", help="comma-separated AI_CHARACTERS ids")
+    parser.add_argument("--sessions", type=int, default=10, help="sessions per character")
+    parser.add_argument("--turns", type=int, default=5, help="therapist messages per session")
+    parser.add_argument("--policy", choices=("scripted", "llm"), default="scripted")
+    parser.add_argument("--script", help="file with one therapist line per line (scripted policy)")
+    parser.add_argument("--parallelism", type=int, default=8, help="sessions played at once")
+    parser.add_argument("--output", default="self_play.ndjson")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    import app as app_module
+    app_module.init_db()
+
+    character_ids = [int(c) for c in args.characters.split(",")]
+    unknown = [c for c in character_ids if c not in app_module.AI_CHARACTERS]
+    if unknown:
+        parser.error(f"unknown character ids: {unknown}")
+
+    if args.policy == "llm":
+        policy = LLMTherapist(app_module.llm)
+    elif args.script:
+        with open(args.script, encoding="utf-8") as f:
+            policy = ScriptedTherapist([line.strip() for line in f if line.strip()])
+    else:
+        policy = ScriptedTherapist(THERAPIST_LINES)
+
+    done = completed_keys(args.output)
+    pending = [
+        (f"{character_id}-{index}", character_id)
+        for character_id in character_ids
+        for index in range(args.sessions)
+        if f"{character_id}-{index}" not in done
+    ]
+    print(f"{len(pending)} sessions to play, {len(done)} already recorded in {args.output}")
+
+    writer = RecordWriter(args.output)
+    counts = {"completed": 0, "failed": 0}
+
+    def run(key, character_id):
+        # Seeded per session, so a resumed run plays the same script
+        record = play_session(app_module, key, character_id, args.turns, policy, random.Random(f"{args.seed}:{key}"))
+        # Written from the worker so sessions in flight at Ctrl-C are still recorded
+        writer.write(record)
+        return record["status"]
+
+    start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=args.parallelism, thread_name_prefix="self-play")
+    try:
+        futures = [executor.submit(run, key, character_id) for key, character_id in pending]
+        for future in as_completed(futures):
+            counts[future.result()] += 1
+    except KeyboardInterrupt:
+        print("Interrupted; finishing the sessions in progress")
+        executor.shutdown(wait=True, cancel_futures=True)
+    finally:
+        executor.shutdown(wait=True)
+        writer.close()
+    print(f"{counts['completed']} completed, {counts['failed']} failed in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Compressed transcripts of ended sessions, and the thread that maintains them"""
+import json
+import zlib
+import logging
+import threading
+
+# Message columns kept in an archived transcript
+ARCHIVED_FIELDS = ("id", "sender", "content", "timestamp", "mood_score", "mood_reflection", "prompt_tokens")
+
+
+def pack_transcript(messages):
+    """Compress a session's Message rows (in transcript order) into one blob"""
+    rows = []
+    for msg in messages:
+        row = {field: getattr(msg, field) for field in ARCHIVED_FIELDS}
+        row["timestamp"] = msg.timestamp.isoformat()
+        rows.append(row)
+    return zlib.compress(json.dumps(rows, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def unpack_transcript(blob):
+    """Message dicts of an archived transcript; timestamps stay ISO strings"""
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class Reaper:
+    """Calls run_once() every interval seconds on a daemon thread.
+
+    The first pass runs one interval after start(), so a backlog of sessions
+    to archive doesn't compete with startup. run_once() must be safe to run
+    in several processes at once.
+    """
+
+    def __init__(self, run_once, interval=300.0):
+        self.run_once = run_once
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logging.error("Session reaper pass failed: %s", e)
+
+    def start(self):
+        """Start the reaper thread (no-op if interval is 0 or already running)"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="session-reaper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
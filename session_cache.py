@@ -0,0 +1,166 @@
+"""In-process cache of active therapy conversations"""
+import threading
+import time
+from collections import OrderedDict
+
+# Rough per-message bookkeeping cost on top of the text itself
+MESSAGE_OVERHEAD_BYTES = 200
+
+
+class SessionCache:
+    """LRU cache of active sessions with TTL and memory-cap eviction.
+
+    Each entry holds what a chat turn needs to build its prompt: the character,
+    the mood state, the rolling summary and the not-yet-summarized messages. The
+    database remains the durable store; entries are rebuilt from it on a miss.
+
+    With several worker processes a session's turns can land on different
+    workers, so each entry remembers the session's message count. is_current()
+    compares it with the database and drops entries another process has moved past.
+    """
+
+    def __init__(self, max_sessions=1000, ttl_seconds=1800, max_bytes=64 * 1024 * 1024, max_messages=None):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0
+
+    @staticmethod
+    def _entry_size(entry):
+        size = len(entry["summary"] or "") + MESSAGE_OVERHEAD_BYTES
+        for msg in entry["history"]:
+            size += len(msg["content"]) + MESSAGE_OVERHEAD_BYTES
+        return size
+
+    def _resize(self, session_id, entry):
+        self._bytes -= entry["size"]
+        entry["size"] = self._entry_size(entry)
+        self._bytes += entry["size"]
+        self._evict(keep=session_id)
+
+    def _drop(self, session_id):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry["size"]
+        return entry
+
+    def _evict(self, keep=None):
+        # Entries are kept in last-used order, so expired ones are at the front
+        now = time.monotonic()
+        while self._entries:
+            oldest, entry = next(iter(self._entries.items()))
+            if oldest == keep or now - entry["touched"] <= self.ttl_seconds:
+                break
+            self._drop(oldest)
+            self.evictions += 1
+        while self._entries and (len(self._entries) > self.max_sessions or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._drop(oldest)
+            self.evictions += 1
+
+    def get(self, session_id):
+        """Return the cached entry for a session, or None on a miss or expiry"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or time.monotonic() - entry["touched"] > self.ttl_seconds:
+                if entry is not None:
+                    self._drop(session_id)
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            entry["touched"] = time.monotonic()
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry
+
+    def put(self, session_id, ai_character_id, current_mood, summary, summary_through, history, message_count=None):
+        """Cache a session loaded from the database; history is a list of {"id", "role", "content"}"""
+        entry = {
+            "session_id": session_id,
+            "ai_character_id": ai_character_id,
+            "current_mood": current_mood,
+            "summary": summary,
+            "summary_through": summary_through,
+            "history": list(history),
+            "message_count": message_count,
+            "touched": time.monotonic(),
+            "size": 0,
+        }
+        with self._lock:
+            self._drop(session_id)
+            self._entries[session_id] = entry
+            self._resize(session_id, entry)
+        return entry
+
+    def append(self, session_id, messages):
+        """Add the messages of a new turn to a cached session"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            entry["history"].extend(messages)
+            if entry["message_count"] is not None:
+                entry["message_count"] += len(messages)
+            if self.max_messages is not None:
+                del entry["history"][:-self.max_messages]
+            entry["touched"] = time.monotonic()
+            self._entries.move_to_end(session_id)
+            self._resize(session_id, entry)
+
+    def set_mood(self, session_id, current_mood):
+        """Record a new mood score for a cached session"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                entry["current_mood"] = current_mood
+
+    def set_summary(self, session_id, summary, summary_through):
+        """Record a summary update and drop the messages it now covers"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            entry["summary"] = summary
+            entry["summary_through"] = summary_through
+            entry["history"] = [msg for msg in entry["history"] if msg["id"] > summary_through]
+            self._resize(session_id, entry)
+
+    def is_current(self, session_id, message_count, summary_through, current_mood):
+        """Check a cached session against its database row, dropping it if turns or a
+        summary were stored by another process; a newer mood is simply taken over"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return False
+            if entry["message_count"] != message_count or entry["summary_through"] != summary_through:
+                self._drop(session_id)
+                self.stale += 1
+                return False
+            entry["current_mood"] = current_mood
+            return True
+
+    def invalidate(self, session_id):
+        """Forget a session, e.g. once it has ended"""
+        with self._lock:
+            self._drop(session_id)
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            return {
+                "sessions": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "stale": self.stale,
+            }
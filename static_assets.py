@@ -0,0 +1,133 @@
+"""Fingerprinted, precompressed static assets held in memory.
+
+At startup every asset is read once, hashed and compressed with gzip (and
+brotli when the brotli package is installed). Stylesheet and script references
+in the HTML pages are rewritten to fingerprinted /assets/ URLs, which are
+served with far-future immutable caching; pages themselves are revalidated
+with their ETag. Restart the app to pick up edited assets.
+"""
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ASSET_EXTENSIONS = {".html", ".css", ".js", ".svg", ".png", ".jpg", ".jpeg", ".gif", ".ico", ".webp", ".woff2"}
+COMPRESSIBLE_EXTENSIONS = {".html", ".css", ".js", ".svg"}
+# Responses smaller than this aren't worth the Content-Encoding overhead
+MIN_COMPRESS_SIZE = 512
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+class Asset:
+    """One file: its body in every encoding that came out smaller than the original"""
+
+    def __init__(self, name, body, mimetype):
+        self.name = name
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        root, ext = os.path.splitext(name)
+        self.fingerprinted_name = f"{root}.{self.digest}{ext}"
+        self.bodies = {"identity": body}
+        if ext in COMPRESSIBLE_EXTENSIONS and len(body) >= MIN_COMPRESS_SIZE:
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.bodies["gzip"] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.bodies["br"] = compressed
+
+    def etag(self, encoding):
+        # Each encoding is a different representation and needs its own strong ETag
+        return self.digest if encoding == "identity" else f"{self.digest}-{encoding}"
+
+
+class StaticAssets:
+    """In-memory asset store; build with load(), serve with response().
+
+    names restricts the store to those files, for a directory that holds more
+    than the site (such as the application root).
+    """
+
+    def __init__(self, directory, url_prefix="/assets", names=None):
+        self.directory = directory
+        self.url_prefix = url_prefix
+        self.names = names
+        self.assets = {}
+        self.fingerprinted = {}
+
+    def _read(self, name):
+        with open(os.path.join(self.directory, name), "rb") as f:
+            return f.read()
+
+    def load(self):
+        """Read, fingerprint and compress every asset in the directory"""
+        self.assets = {}
+        self.fingerprinted = {}
+        if not os.path.isdir(self.directory):
+            return self
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if os.path.splitext(name)[1] in ASSET_EXTENSIONS and os.path.isfile(os.path.join(self.directory, name))
+            and (self.names is None or name in self.names)
+        )
+        # Pages reference the other assets, so those are hashed first
+        for name in (n for n in names if not n.endswith(".html")):
+            self._add(name, self._read(name))
+        for name in (n for n in names if n.endswith(".html")):
+            self._add(name, self._rewrite_references(self._read(name)))
+        return self
+
+    def _add(self, name, body):
+        mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        asset = Asset(name, body, mimetype)
+        self.assets[name] = asset
+        self.fingerprinted[asset.fingerprinted_name] = asset
+
+    def _rewrite_references(self, html):
+        def replace(match):
+            asset = self.assets.get(match.group(2))
+            return f'{match.group(1)}="{self.url(asset.name)}"' if asset else match.group(0)
+        return re.sub(r'(href|src)="/?([\w.-]+\.(?:css|js))"', replace, html.decode("utf-8")).encode("utf-8")
+
+    def url(self, name):
+        """Fingerprinted URL of an asset, for use in pages and templates"""
+        return f"{self.url_prefix}/{self.assets[name].fingerprinted_name}"
+
+    @staticmethod
+    def _negotiate(asset, accept_encodings):
+        for encoding in ("br", "gzip"):
+            if encoding in asset.bodies and accept_encodings[encoding]:
+                return encoding
+        return "identity"
+
+    def response(self, request, name=None, fingerprinted_name=None):
+        """Serve an asset by name (revalidated) or by fingerprinted name (immutable); None if unknown"""
+        if fingerprinted_name is not None:
+            asset = self.fingerprinted.get(fingerprinted_name)
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            asset = self.assets.get(name)
+            cache_control = REVALIDATE_CACHE_CONTROL
+        if asset is None:
+            return None
+
+        encoding = self._negotiate(asset, request.accept_encodings)
+        response = Response(asset.bodies[encoding], mimetype=asset.mimetype)
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = cache_control
+        response.set_etag(asset.etag(encoding))
+        # Answers If-None-Match with a bodyless 304
+        return response.make_conditional(request)
+
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from llm import LLMError
+from llm_scheduler import BACKGROUND, INTERACTIVE, MOOD, LLMScheduler, TokenBucket
+
+
+def drained_scheduler(per_second=10, **kwargs):
+    """A scheduler whose request bucket is empty and refills per_second requests a second"""
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0, **kwargs)
+    scheduler.requests = TokenBucket(per_second * 60)
+    scheduler.requests.level = 0
+    return scheduler
+
+
+def test_queued_calls_are_admitted_in_priority_order():
+    scheduler = drained_scheduler()
+    order = []
+    threads = []
+    for priority in (BACKGROUND, MOOD, INTERACTIVE):
+        thread = threading.Thread(target=scheduler.call, args=(priority, lambda p=priority: order.append(p)))
+        thread.start()
+        threads.append(thread)
+        # Let each caller queue before the next one arrives
+        while scheduler.stats()["queue_depth"] < len(threads):
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+    assert order == [INTERACTIVE, MOOD, BACKGROUND]
+
+
+def test_caller_past_its_deadline_gets_a_429_without_calling_the_provider():
+    scheduler = drained_scheduler(per_second=0.01, max_wait={INTERACTIVE: 0.1})
+    calls = []
+    start = time.monotonic()
+    with pytest.raises(LLMError) as error:
+        scheduler.call(INTERACTIVE, lambda: calls.append(1))
+    assert error.value.status_code == 429
+    assert calls == []
+    assert time.monotonic() - start < 1
+    assert scheduler.stats()["priorities"]["interactive"]["timeouts"] == 1
+
+
+def failing_once(error, result="ok"):
+    attempts = []
+
+    def fn():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise error
+        return result
+    return fn, attempts
+
+
+def test_retry_after_is_honored_beyond_max_delay():
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0, max_delay=0.01)
+    fn, attempts = failing_once(LLMError("rate limited", status_code=429, retry_after=0.2))
+    assert scheduler.call(BACKGROUND, fn) == "ok"
+    assert attempts[1] - attempts[0] >= 0.2
+
+
+def test_retry_after_beyond_the_deadline_raises_at_once():
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0, max_wait={INTERACTIVE: 1.0})
+    fn, attempts = failing_once(LLMError("rate limited", status_code=429, retry_after=30))
+    start = time.monotonic()
+    with pytest.raises(LLMError):
+        scheduler.call(INTERACTIVE, fn)
+    assert len(attempts) == 1
+    assert time.monotonic() - start < 0.5
+
+
+def test_429_pauses_admission_for_other_callers():
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0)
+    fn, _ = failing_once(LLMError("rate limited", status_code=429, retry_after=0.3))
+    thread = threading.Thread(target=scheduler.call, args=(INTERACTIVE, fn))
+    thread.start()
+    while scheduler._paused_until == 0.0:
+        time.sleep(0.001)
+    admitted = []
+
+    async def record():
+        admitted.append(time.monotonic())
+
+    asyncio.run(scheduler.acall(BACKGROUND, record))
+    thread.join()
+    assert admitted[0] >= scheduler._paused_until
+
+
+def test_jittered_backoff_never_exceeds_max_delay():
+    scheduler = LLMScheduler(max_delay=1.0)
+    deadline = time.monotonic() + 600
+    assert max(scheduler._backoff(10, LLMError("unavailable", status_code=503), deadline) for _ in range(200)) <= 1.0
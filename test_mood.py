@@ -0,0 +1,34 @@
+from mood import BIGRAMS, LexiconMoodScorer, features, tokenize, valence
+
+
+def score_of(text):
+    return valence(features(tokenize(text)), BIGRAMS)
+
+
+def test_negator_led_bigrams_keep_their_own_sign():
+    assert score_of("I am not alone") == BIGRAMS[("not", "alone")]
+    assert score_of("there is no point") == BIGRAMS[("no", "point")]
+    assert score_of("it is not enough") == BIGRAMS[("not", "enough")]
+
+
+def test_negation_still_flips_following_words():
+    assert valence(features(tokenize("I am not happy")), {"happy": 2.5}) < 0
+
+
+def test_not_alone_lifts_mood_above_baseline():
+    scorer = LexiconMoodScorer()
+    baseline = scorer.initial(3)["mood_score"]
+    assert scorer.score(3, "I realise I am not alone anymore", "")["mood_score"] > baseline
+    assert scorer.score(3, "There is no point. It is not enough.", "")["mood_score"] < baseline
+
+
+def test_score_transcript_matches_scoring_each_exchange():
+    scorer = LexiconMoodScorer()
+    exchanges = [
+        ("I realise I am not alone anymore", "You matter here."),
+        ("There is no point. It is not enough.", "How are you today?"),
+        ("", ""),
+    ]
+    assert scorer.score_transcript(3, exchanges) == [scorer.score(3, reply, message) for reply, message in exchanges]
+    assert scorer.score_transcript(99, exchanges[:1]) == [scorer.score(99, *exchanges[0])]
+    assert scorer.score_transcript(3, []) == []